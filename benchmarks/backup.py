@@ -0,0 +1,164 @@
+"""Backup benchmark: throughput of importing and exporting chats as JSON lines.
+
+A synthetic export is generated as a stream, imported into a fresh database,
+imported again to check that nothing is stored twice, and exported again. Peak
+memory is reported after each step, it should stay flat as --messages grows. The
+database is created in the working directory, so run it from an empty one:
+
+    python -m benchmarks.backup --messages 200000 --gzip --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+import uuid
+from typing import Any
+
+from .streaming import _git_revision
+
+WORDS = (
+    "river mountain budget recipe garden python socket theorem invoice guitar "
+    "kernel orbit pasta ledger violin compiler harbor quartz meadow tensor"
+).split()
+
+
+def _peak_memory_mb() -> float:
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_export(path: str, chats: int, messages: int, reasoning_chars: int):
+    from deepseek_ollama_solara.backup import FORMAT_VERSION, _json_default, _open
+
+    generator = random.Random(0)
+    chat_ids = [uuid.uuid4() for _ in range(chats)]
+    created = datetime.datetime(2025, 1, 1)
+    with _open(path, "w") as file:
+        file.write(json.dumps({"type": "export", "version": FORMAT_VERSION}) + "\n")
+        for index, chat_id in enumerate(chat_ids):
+            record = {
+                "type": "chat",
+                "id": chat_id,
+                "title": f"Chat {index}",
+                "model": "deepseek-r1:8b",
+                "last_activity": created,
+            }
+            file.write(json.dumps(record, default=_json_default) + "\n")
+        for index in range(messages):
+            created += datetime.timedelta(seconds=1)
+            assistant = index % 2 == 1
+            record = {
+                "type": "message",
+                "id": uuid.uuid4(),
+                "chat_id": chat_ids[index // 2 % chats],
+                "role": "assistant" if assistant else "user",
+                "created": created,
+                "content": " ".join(generator.choices(WORDS, k=60)),
+                "truncated": False,
+                "chain_of_reason": (
+                    " ".join(generator.choices(WORDS, k=reasoning_chars // 7))
+                    if assistant
+                    else None
+                ),
+            }
+            file.write(json.dumps(record, default=_json_default) + "\n")
+
+
+async def run(args: argparse.Namespace, directory: str) -> dict[str, Any]:
+    from deepseek_ollama_solara.backup import _open, export_chats, import_chats
+    from deepseek_ollama_solara.database import connect_database, disconnect_database
+
+    suffix = ".jsonl.gz" if args.gzip else ".jsonl"
+    source = os.path.join(directory, f"source{suffix}")
+    exported = os.path.join(directory, f"exported{suffix}")
+    write_export(source, args.chats, args.messages, args.reasoning_chars)
+    source_mb = os.path.getsize(source) / 2**20
+
+    await connect_database()
+    baseline_memory = _peak_memory_mb()
+
+    started = time.perf_counter()
+    with _open(source, "r") as file:
+        new_chats, _, new_messages, _ = await import_chats(file)
+    import_time = time.perf_counter() - started
+    import_memory = _peak_memory_mb()
+
+    started = time.perf_counter()
+    with _open(source, "r") as file:
+        _, _, repeated_messages, _ = await import_chats(file)
+    reimport_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with _open(exported, "w") as file:
+        exported_chats, exported_messages = await export_chats(file)
+    export_time = time.perf_counter() - started
+    export_memory = _peak_memory_mb()
+    await disconnect_database()
+
+    return {
+        "file_mb": source_mb,
+        "import": {
+            "seconds": import_time,
+            "messages_per_second": new_messages / import_time,
+            "new_chats": new_chats,
+            "new_messages": new_messages,
+        },
+        "reimport": {"seconds": reimport_time, "new_messages": repeated_messages},
+        "export": {
+            "seconds": export_time,
+            "messages_per_second": exported_messages / export_time,
+            "chats": exported_chats,
+            "messages": exported_messages,
+        },
+        "peak_memory_mb": {
+            "after_connect": baseline_memory,
+            "after_import": import_memory,
+            "after_export": export_memory,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=1000, help="chats in the export")
+    parser.add_argument("--messages", type=int, default=100_000, help="messages in the export")
+    parser.add_argument(
+        "--reasoning-chars", type=int, default=2000, help="reasoning length of answers"
+    )
+    parser.add_argument("--gzip", action="store_true", help="compress the files with gzip")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = asyncio.run(run(args, directory))
+    output = json.dumps(
+        {
+            "benchmark": "backup",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "parameters": {
+                "chats": args.chats,
+                "messages": args.messages,
+                "reasoning_chars": args.reasoning_chars,
+                "gzip": args.gzip,
+            },
+            **results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""A local stand-in for the Ollama HTTP API that replays scripted chat streams.
+
+Only the endpoints the app uses are implemented. Streams are generated by a script
+function, which gets the decoded request body and returns the chunks to send.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import re
+import zlib
+from collections.abc import Callable, Sequence
+from http import HTTPStatus
+from typing import Any, cast
+
+Script = Callable[[dict[str, Any]], list[dict[str, Any]]]
+
+# Length of the vectors /api/embed returns when the request doesn't ask for a length
+EMBEDDING_LENGTH = 768
+
+
+def _chunk(model: str, content: str = "", **fields: Any) -> dict[str, Any]:
+    return {
+        "model": model,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "message": {"role": "assistant", "content": content, **fields.pop("message", {})},
+        "done": False,
+        **fields,
+    }
+
+
+def reasoning_script(
+    think_tokens: int = 500, answer_tokens: int = 200, tool_call: dict[str, Any] | None = None
+) -> Script:
+    """Builds a script that streams a <think> block followed by an answer.
+
+    When `tool_call` is given and the request offers tools, the first response is
+    that tool call; the answer is streamed once the tool result is in the history.
+    """
+
+    def script(request: dict[str, Any]) -> list[dict[str, Any]]:
+        model = request["model"]
+        history = request.get("messages") or []
+        if tool_call is not None and request.get("tools") and history[-1]["role"] != "tool":
+            return [
+                _chunk(model, message={"tool_calls": [{"function": tool_call}]}),
+                _chunk(model, done=True, done_reason="stop"),
+            ]
+
+        chunks = [_chunk(model, "<think>")]
+        chunks += [_chunk(model, f"thought{index} ") for index in range(think_tokens)]
+        chunks.append(_chunk(model, "</think>"))
+        chunks += [_chunk(model, f"word{index} ") for index in range(answer_tokens)]
+        chunks.append(
+            _chunk(
+                model,
+                done=True,
+                done_reason="stop",
+                total_duration=1_000_000,
+                load_duration=1_000,
+                prompt_eval_count=sum(len(m.get("content") or "") // 4 for m in history),
+                prompt_eval_duration=1_000,
+                eval_count=think_tokens + answer_tokens + 2,
+                eval_duration=1_000_000,
+            )
+        )
+        return chunks
+
+    return script
+
+
+def hashed_embedding(text: str, dimensions: int = EMBEDDING_LENGTH) -> list[float]:
+    """A bag of words vector, so texts sharing words come out similar."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        hashed = zlib.crc32(word.encode())
+        vector[hashed % dimensions] += 1.0 if hashed & 1 << 31 else -1.0
+    return vector
+
+
+class FakeOllamaServer:
+    def __init__(
+        self,
+        script: Script | None = None,
+        models: Sequence[str] = ("deepseek-r1:8b",),
+        token_rate: float = 0,
+        load_time: float = 0,
+        capabilities: dict[str, list[str]] | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.script = script or reasoning_script()
+        self.models = list(models)
+        # chunks per second per stream, 0 streams as fast as possible
+        self.token_rate = token_rate
+        # seconds it takes to "load" a model that isn't loaded yet
+        self.load_time = load_time
+        self.loaded: set[str] = set()
+        # reported by /api/show, models not listed support completion and tools
+        self.capabilities = capabilities or {}
+        self.host = host
+        self.port = port
+        self.requests: list[tuple[str, dict[str, Any]]] = []
+        self.chunks_sent = 0
+        # chat responses being streamed now, and the most there were at once
+        self.streaming = 0
+        self.max_streaming = 0
+        self._server: asyncio.Server | None = None
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # idle keep-alive connections would otherwise keep their handlers waiting
+            for writer in self._connections:
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = cast(asyncio.Task, asyncio.current_task())
+        try:
+            # keep-alive: serve requests until the client closes the connection
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                request = json.loads(body) if body else {}
+                self.requests.append((path, request))
+                await self._route(method, path, request, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _route(
+        self, method: str, path: str, request: dict[str, Any], writer: asyncio.StreamWriter
+    ):
+        if path == "/api/tags":
+            await self._send_json(writer, {"models": [self._model_info(m) for m in self.models]})
+        elif path == "/api/ps":
+            await self._send_json(
+                writer, {"models": [self._model_info(m) for m in sorted(self.loaded)]}
+            )
+        elif (
+            path in ("/api/chat", "/api/generate", "/api/embed")
+            and request.get("model") not in self.models
+        ):
+            await self._send_json(
+                writer, {"error": f"model '{request.get('model')}' not found"}, status=404
+            )
+        elif path == "/api/show":
+            model = request.get("model")
+            if model not in self.models:
+                await self._send_json(writer, {"error": f"model '{model}' not found"}, status=404)
+            else:
+                await self._send_json(
+                    writer,
+                    {
+                        "modified_at": "2025-01-01T00:00:00Z",
+                        "template": "{{ .Prompt }}",
+                        "model_info": {},
+                        "details": {"family": model.split(":")[0]},
+                        "capabilities": self.capabilities.get(model, ["completion", "tools"]),
+                    },
+                )
+        elif path == "/api/generate":
+            # only loading a model without a prompt is supported
+            await self._load(request["model"])
+            await self._send_json(
+                writer,
+                {
+                    "model": request["model"],
+                    "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "response": "",
+                    "done": True,
+                    "done_reason": "load",
+                },
+            )
+        elif path == "/api/embed":
+            await self._load(request["model"])
+            texts = request["input"]
+            dimensions = request.get("dimensions") or EMBEDDING_LENGTH
+            await self._send_json(
+                writer,
+                {
+                    "model": request["model"],
+                    "embeddings": [
+                        hashed_embedding(text, dimensions)
+                        for text in ([texts] if isinstance(texts, str) else texts)
+                    ],
+                },
+            )
+        elif path == "/api/chat":
+            await self._load(request["model"])
+            if request.get("stream", True):
+                await self._stream(writer, self.script(request))
+            else:
+                await self._send_json(writer, self.script(request)[-1])
+        else:
+            await self._send_json(writer, {"error": f"{method} {path} not found"}, status=404)
+
+    async def _load(self, model: str):
+        if model not in self.loaded:
+            await asyncio.sleep(self.load_time)
+            self.loaded.add(model)
+
+    def _model_info(self, model: str) -> dict[str, Any]:
+        return {
+            "name": model,
+            "model": model,
+            "modified_at": "2025-01-01T00:00:00Z",
+            "digest": f"sha256:{hashlib.sha256(model.encode()).hexdigest()}",
+            "size": 1,
+            "details": {"family": model.split(":")[0]},
+        }
+
+    async def _send_json(self, writer: asyncio.StreamWriter, payload: Any, status: int = 200):
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, chunks: list[dict[str, Any]]):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        delay = 1 / self.token_rate if self.token_rate else 0
+        self.streaming += 1
+        self.max_streaming = max(self.max_streaming, self.streaming)
+        try:
+            for chunk in chunks:
+                line = json.dumps(chunk).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.chunks_sent += 1
+                await writer.drain()
+                await asyncio.sleep(delay)
+        finally:
+            self.streaming -= 1
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
@@ -0,0 +1,117 @@
+"""Cold start benchmark: how long a fresh interpreter takes to import the app.
+
+`solara run` imports the server before it imports the app, so the two are timed
+separately, and each run starts a new interpreter so nothing is cached in memory
+but the files themselves.
+
+    python -m benchmarks.import_time --runs 10 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+from .streaming import _git_revision, _percentile
+
+APP_MODULE = "deepseek_ollama_solara.app"
+
+# Dependencies that only some features need, reported when the app import loads them
+OPTIONAL_MODULES = ("duckduckgo_search", "mediawiki", "sqlalchemy", "numpy")
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import solara.server.starlette
+server_imported = time.perf_counter()
+import {APP_MODULE}
+app_imported = time.perf_counter()
+print(json.dumps({{
+    "server": server_imported - started,
+    "app": app_imported - server_imported,
+    "modules": [name for name in {OPTIONAL_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def _run_probe(importtime: bool = False) -> tuple[dict[str, Any], float, str]:
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", PROBE]
+    started = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+    return json.loads(process.stdout.splitlines()[-1]), elapsed, process.stderr
+
+
+def _app_imports(importtime_output: str) -> dict[str, float]:
+    # -X importtime lists a module after everything it imported, indented one level
+    # deeper than the module, so the app's own imports are the lines just above it
+    imports: dict[str, float] = {}
+    lines = [line for line in importtime_output.splitlines() if line.startswith("import time:")]
+    for line in lines:
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            # a top level import, everything listed so far belonged to it
+            if name.strip() == APP_MODULE:
+                break
+            imports.clear()
+        elif not name.startswith("    "):
+            imports[name.strip()] = int(cumulative) / 1000
+    else:
+        return {}
+    return dict(sorted(imports.items(), key=lambda item: -item[1]))
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    server_times: list[float] = []
+    app_times: list[float] = []
+    process_times: list[float] = []
+    modules: list[str] = []
+    for _ in range(args.runs):
+        probe, elapsed, _ = _run_probe()
+        server_times.append(probe["server"])
+        app_times.append(probe["app"])
+        process_times.append(elapsed)
+        modules = probe["modules"]
+    _, _, importtime_output = _run_probe(importtime=True)
+
+    def summary(values: list[float]) -> dict[str, float]:
+        return {
+            "mean": statistics.fmean(values) * 1000,
+            "p50": _percentile(values, 0.5) * 1000,
+            "p95": _percentile(values, 0.95) * 1000,
+        }
+
+    return {
+        "benchmark": "import_time",
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "server_import_ms": summary(server_times),
+        "app_import_ms": summary(app_times),
+        "process_ms": summary(process_times),
+        "optional_modules_loaded": modules,
+        # milliseconds, from one extra run under -X importtime, which inflates them
+        "app_imports_ms": _app_imports(importtime_output),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Memory benchmark: searching the vector index, and recalling a fact from another chat.
+
+The search part fills an index with random vectors and times queries against it.
+The recall part stores chats in a fresh database, indexes them through the fake
+Ollama server's bag of words embeddings, and checks that a planted fact comes back
+when a new chat asks about it. The database is created in the working directory,
+so run it from an empty one:
+
+    python -m benchmarks.memory --rows 1000000 --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+
+from .fake_ollama import FakeOllamaServer
+from .streaming import _git_revision, _percentile
+
+FACT = "The wifi password at the lake cabin is heron47"
+QUESTION = "What was the wifi password at the lake cabin?"
+ANSWER = "heron47"
+
+WORDS = (
+    "river mountain budget recipe garden python socket theorem invoice guitar "
+    "kernel orbit pasta ledger violin compiler harbor quartz meadow tensor"
+).split()
+
+
+def search_latency(rows: int, dimensions: int, queries: int) -> dict[str, Any]:
+    from deepseek_ollama_solara.memory import VectorStore, normalize
+
+    generator = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = VectorStore(os.path.join(directory, "vectors"), dimensions)
+        store.open()
+        started = time.perf_counter()
+        for start in range(0, rows, 65536):
+            count = min(65536, rows - start)
+            store.write(
+                start, normalize(generator.standard_normal((count, dimensions)), dimensions)
+            )
+        fill_time = time.perf_counter() - started
+
+        latencies: list[float] = []
+        for _ in range(queries):
+            query = normalize(generator.standard_normal((1, dimensions)), dimensions)[0]
+            started = time.perf_counter()
+            store.search(query, rows, 32)
+            latencies.append(time.perf_counter() - started)
+        file_size = os.path.getsize(store.path)
+
+    return {
+        "rows": rows,
+        "dimensions": dimensions,
+        "file_mb": file_size / 2**20,
+        "fill_s": fill_time,
+        "search_ms": {
+            "mean": statistics.fmean(latencies) * 1000,
+            "p50": _percentile(latencies, 0.5) * 1000,
+            "p95": _percentile(latencies, 0.95) * 1000,
+        },
+    }
+
+
+async def recall(chats: int, messages_per_chat: int) -> dict[str, Any]:
+    # reactive variables are only scoped per kernel when running under the solara server
+    import solara.server.starlette  # noqa: F401
+
+    from deepseek_ollama_solara.database import (
+        connect_database,
+        create_chat,
+        disconnect_database,
+        save_messages,
+    )
+    from deepseek_ollama_solara.memory import EMBEDDING_MODEL, memory_index
+    from deepseek_ollama_solara.types import Message
+
+    generator = random.Random(0)
+    async with FakeOllamaServer(models=[EMBEDDING_MODEL]) as server:
+        os.environ["OLLAMA_HOSTS"] = server.url
+        await connect_database()
+        created = datetime.datetime.now() - datetime.timedelta(days=30)
+        fact_chat = generator.randrange(chats)
+        for index in range(chats):
+            chat_id = uuid.uuid4()
+            await create_chat(f"Chat {index}", chat_id, "deepseek-r1:8b")
+            chat_messages = []
+            for position in range(messages_per_chat):
+                created += datetime.timedelta(seconds=1)
+                content = " ".join(generator.choices(WORDS, k=40))
+                if index == fact_chat and position == 0:
+                    content = FACT
+                role = "user" if position % 2 == 0 else "assistant"
+                chat_messages.append(
+                    (chat_id, Message(role=role, created=created, content=content))
+                )
+            await save_messages(chat_messages)
+
+        started = time.perf_counter()
+        await memory_index.sync()
+        index_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        recollections = await memory_index.recall(QUESTION, uuid.uuid4())
+        recall_time = time.perf_counter() - started
+        await disconnect_database()
+
+    return {
+        "messages": chats * messages_per_chat,
+        "index_s": index_time,
+        "recall_ms": recall_time * 1000,
+        "recalled": len(recollections),
+        "fact_recalled": any(ANSWER in recollection["content"] for recollection in recollections),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="vectors in the index")
+    parser.add_argument("--dimensions", type=int, default=256, help="length of the vectors")
+    parser.add_argument("--queries", type=int, default=20, help="searches to time")
+    parser.add_argument("--chats", type=int, default=200, help="chats stored for the recall check")
+    parser.add_argument("--messages", type=int, default=10, help="messages per stored chat")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(
+        {
+            "benchmark": "memory",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "search": search_latency(args.rows, args.dimensions, args.queries),
+            "recall": asyncio.run(recall(args.chats, args.messages)),
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark of the passage selection used by the web tools, on a fixture article.
+
+The fixture is padded with filler sections to the size of a long Wikipedia article,
+then every query is checked to find the section that answers it.
+
+    python -m benchmarks.passages --size 200 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from typing import Any
+
+from deepseek_ollama_solara.tools.passages import (
+    format_passages,
+    select_passages,
+    split_passages,
+    tokenize,
+)
+
+from .streaming import _git_revision, _percentile
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "lighthouse.txt")
+
+# query, section expected among the selected passages
+QUERIES = [
+    ("who invented the Fresnel lens", "Lens and light sources"),
+    ("when was the last lighthouse keeper replaced by automation", "Keepers"),
+    ("what does Fl(2) W 10s mean", "Light characteristics"),
+    ("how were towers on wave swept rocks built", "Architecture"),
+    ("Pharos of Alexandria earthquakes", "History"),
+]
+
+
+def padded_article(size_kb: int, seed: int = 0) -> str:
+    with open(FIXTURE) as file:
+        article = file.read()
+    # filler sections reuse the article's vocabulary, so they compete for matches
+    words = tokenize(article)
+    rng = random.Random(seed)
+    sections = [article]
+    index = 0
+    while sum(len(section) for section in sections) < size_kb * 1024:
+        paragraphs = [" ".join(rng.choices(words, k=120)) + "." for _ in range(4)]
+        sections.append(f"== Filler {index} ==\n" + "\n".join(paragraphs))
+        index += 1
+    return "\n\n".join(sections)
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    article = padded_article(args.size)
+    timings: list[float] = []
+    results = []
+    for query, expected_section in QUERIES:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            passages = select_passages(split_passages(article), query)
+            timings.append(time.perf_counter() - started)
+        selected = format_passages(passages)
+        results.append(
+            {
+                "query": query,
+                "found": any(passage["section"] == expected_section for passage in passages),
+                "sections": [passage["section"] for passage in passages],
+                "chars": len(selected),
+            }
+        )
+
+    return {
+        "benchmark": "passages",
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "article_chars": len(article),
+        "passages": len(split_passages(article)),
+        "selection_ms": {
+            "mean": statistics.fmean(timings) * 1000,
+            "p50": _percentile(timings, 0.5) * 1000,
+            "p95": _percentile(timings, 0.95) * 1000,
+        },
+        "queries": results,
+        "all_found": all(result["found"] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200, help="article size in kilobytes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per query")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Reasoning parser benchmark: splitting multi-megabyte streams into reasoning and answer.
+
+Before timing anything, generated streams are cut into random deltas, including
+cuts inside tags, and the parser's output is checked against the known split. Then
+the parser, and the accumulator that builds messages from its output, are timed on
+a long stream of short deltas. It exits with an error when any split was wrong.
+
+    python -m benchmarks.reasoning --megabytes 4 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Any
+
+from deepseek_ollama_solara.reasoning import DEFAULT_DELIMITERS, ReasoningParser, Segment
+from deepseek_ollama_solara.streaming import StreamAccumulator
+
+from .streaming import _git_revision
+
+# text that looks like the start of a tag without being one
+DECOYS = ("<", "</", "<th", "</thin", "<Tho", "</Thought", "<<", "think>", "/>")
+WORDS = ("alpha", "beta", "gamma", "\n", " ", "delta", "<b>", "x < y", "a</b")
+
+
+def _merge(segments: list[Segment]) -> list[Segment]:
+    merged: list[Segment] = []
+    for text, thinking in segments:
+        if merged and merged[-1][1] == thinking:
+            merged[-1] = (merged[-1][0] + text, thinking)
+        elif text:
+            merged.append((text, thinking))
+    return merged
+
+
+def _generate(generator: random.Random, delimiters: tuple[str, str]) -> tuple[str, list[Segment]]:
+    open_tag, close_tag = delimiters
+    parts: list[str] = []
+    expected: list[Segment] = []
+    thinking = False
+    for _ in range(generator.randint(0, 6)):
+        text = "".join(generator.choice(WORDS + DECOYS) for _ in range(generator.randint(0, 8)))
+        # a decoy right before a tag makes the tag look like it starts early
+        if generator.random() < 0.3:
+            text += generator.choice(DECOYS)
+        # decoys can add up to a whole tag, which would make the expected split wrong
+        if open_tag in text or close_tag in text:
+            text = text.replace("<", "[")
+        parts.append(text)
+        expected.append((text, thinking))
+        parts.append(close_tag if thinking else open_tag)
+        thinking = not thinking
+    tail = "".join(generator.choice(WORDS) for _ in range(generator.randint(0, 4)))
+    parts.append(tail)
+    expected.append((tail, thinking))
+    return "".join(parts), _merge(expected)
+
+
+def _split(generator: random.Random, text: str) -> list[str]:
+    cuts = sorted(
+        generator.sample(range(1, len(text)), min(len(text) - 1, generator.randint(0, 12)))
+    )
+    return [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)])]
+
+
+def check(cases: int, seed: int = 0) -> dict[str, Any]:
+    generator = random.Random(seed)
+    failures: list[dict[str, Any]] = []
+    for case in range(cases):
+        delimiters = DEFAULT_DELIMITERS if case % 2 == 0 else ("<Thought>", "</Thought>")
+        text, expected = _generate(generator, delimiters)
+        deltas = _split(generator, text) if len(text) > 1 else [text]
+        parser = ReasoningParser(delimiters)
+        segments = [segment for delta in deltas for segment in parser.feed(delta)]
+        segments += parser.finish()
+        if _merge(segments) != expected:
+            failures.append({"deltas": deltas, "expected": expected, "got": _merge(segments)})
+    return {"cases": cases, "failures": len(failures), "first_failure": failures[:1]}
+
+
+def _stream(megabytes: float) -> list[str]:
+    # reasoning for the first three quarters, then the answer, with both tags split
+    reasoning = ["<thi", "nk>"]
+    answer = ["</th", "ink>\n\n"]
+    size = 0
+    while size < megabytes * 2**20:
+        delta = f"word{len(reasoning) + len(answer)} "
+        (reasoning if size < megabytes * 2**20 * 3 / 4 else answer).append(delta)
+        size += len(delta)
+    return reasoning + answer
+
+
+def time_parser(deltas: list[str]) -> float:
+    parser = ReasoningParser()
+    started = time.perf_counter()
+    for delta in deltas:
+        parser.feed(delta)
+    parser.finish()
+    return time.perf_counter() - started
+
+
+def time_accumulator(deltas: list[str]) -> float:
+    # flushes every STREAM_FLUSH_TOKENS deltas, like a fast stream would
+    accumulator = StreamAccumulator(flush_interval=float("inf"))
+    started = time.perf_counter()
+    for delta in deltas:
+        if accumulator.append_content(delta):
+            accumulator.flush()
+    accumulator.finish()
+    accumulator.flush()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=4, help="size of the timed stream")
+    parser.add_argument("--cases", type=int, default=20_000, help="random streams to check")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    correctness = check(args.cases)
+    deltas = _stream(args.megabytes)
+    megabytes = sum(len(delta) for delta in deltas) / 2**20
+    parser_time = time_parser(deltas)
+    accumulator_time = time_accumulator(deltas)
+    output = json.dumps(
+        {
+            "benchmark": "reasoning",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "correctness": correctness,
+            "stream": {"megabytes": megabytes, "deltas": len(deltas)},
+            "parser": {"seconds": parser_time, "megabytes_per_second": megabytes / parser_time},
+            "accumulator": {
+                "seconds": accumulator_time,
+                "megabytes_per_second": megabytes / accumulator_time,
+            },
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    if correctness["failures"]:
+        sys.exit(f"The parser got {correctness['failures']} of {args.cases} streams wrong")
+
+
+if __name__ == "__main__":
+    main()
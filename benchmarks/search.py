@@ -0,0 +1,114 @@
+"""Search benchmark: full-text search over a large chat history.
+
+A synthetic history is imported into a fresh database, and every query is timed
+through `search_messages`, including the short prefixes sent while typing. The
+database is created in the working directory, so run it from an empty one:
+
+    python -m benchmarks.search --messages 1000000 --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import random
+import statistics
+import time
+import uuid
+from typing import Any
+
+from .streaming import _git_revision, _percentile
+
+# a large vocabulary, plus common words that are in most messages
+VOCABULARY = [f"w{index}" for index in range(50_000)]
+COMMON_WORDS = "the a of and to in is you that it for on are with as this".split()
+# from the prefix of the first keystroke to a whole rare word, and a common word
+QUERIES = ("w", "w1", "w12", "w123", "w1234", "the", "the w12", "wifi password")
+
+
+async def fill(messages: int, chats: int) -> float:
+    from deepseek_ollama_solara.database import import_rows
+    from deepseek_ollama_solara.types import Message
+
+    generator = random.Random(0)
+    chat_ids = [uuid.uuid4() for _ in range(chats)]
+    chat_values = [
+        {"id": chat_id, "title": f"Chat {index}", "model": "deepseek-r1:8b"}
+        for index, chat_id in enumerate(chat_ids)
+    ]
+    created = datetime.datetime(2025, 1, 1)
+    started = time.perf_counter()
+    await import_rows(chat_values, [])
+    for start in range(0, messages, 2000):
+        batch = []
+        for index in range(start, min(start + 2000, messages)):
+            created += datetime.timedelta(seconds=1)
+            message = Message(
+                role="assistant" if index % 2 else "user",
+                created=created,
+                content=" ".join(
+                    generator.choices(VOCABULARY, k=30) + generator.choices(COMMON_WORDS, k=10)
+                ),
+            )
+            batch.append((chat_ids[index // 2 % chats], message))
+        await import_rows([], batch)
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    from deepseek_ollama_solara.database import (
+        connect_database,
+        disconnect_database,
+        search_messages,
+    )
+
+    await connect_database()
+    try:
+        fill_time = await fill(args.messages, args.chats)
+        queries = {}
+        for terms in QUERIES:
+            latencies: list[float] = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                results = await search_messages(terms)
+                latencies.append(time.perf_counter() - started)
+            queries[terms] = {
+                "results": len(results),
+                "mean_ms": statistics.fmean(latencies) * 1000,
+                "p50_ms": _percentile(latencies, 0.5) * 1000,
+                "max_ms": max(latencies) * 1000,
+            }
+    finally:
+        await disconnect_database()
+    return {"fill_s": fill_time, "queries": queries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000, help="messages in the history")
+    parser.add_argument("--chats", type=int, default=1000, help="chats the messages are in")
+    parser.add_argument("--repeat", type=int, default=5, help="times each query is timed")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = json.dumps(
+        {
+            "benchmark": "search",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "parameters": {"messages": args.messages, "chats": args.chats},
+            **results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""End to end benchmark of the chat hot path against a fake Ollama server.
+
+Each simulated session runs in its own Solara kernel context, so it gets its own
+reactive state, and goes through the generation scheduler, `chat_loop` (and with it
+`process_response`) and the message writer, like `promt_ai` does.
+
+    python -m benchmarks.streaming --sessions 1 10 100 --output results.json
+
+With `--backends 3`, the sessions are spread over three fake servers the way
+requests are routed between several Ollama hosts. The results show how many requests
+each server got, and the most it streamed at once.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any
+
+from deepseek_ollama_solara.types import ChatDict
+
+from .fake_ollama import FakeOllamaServer, reasoning_script
+
+MODEL = "deepseek-r1:8b"
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run_session(
+    index: int,
+    chat: ChatDict,
+    turns: int,
+    tool_calls: bool,
+    db_latencies: list[float],
+    db_errors: list[str],
+) -> int:
+    from solara.server import kernel
+    from solara.server.kernel_context import VirtualKernelContext
+
+    from deepseek_ollama_solara import app
+    from deepseek_ollama_solara.client import RoutedClient
+    from deepseek_ollama_solara.persistence import TurnCheckpointer, message_writer
+    from deepseek_ollama_solara.scheduler import scheduler
+    from deepseek_ollama_solara.types import Message
+
+    context = VirtualKernelContext(
+        id=f"benchmark-{index}", session_id=f"benchmark-{index}", kernel=kernel.Kernel()
+    )
+    updates = 0
+
+    def count_update(_value):
+        nonlocal updates
+        updates += 1
+
+    async with context:
+        unsubscribe = app.messages.subscribe(count_update)
+        app.selected_chat.value = chat
+        # reactive variables belong to the kernel, so this is set per session
+        app.use_tools.value = tool_calls
+        for turn in range(turns):
+            user_message = Message(
+                role="user",
+                created=datetime.datetime.now(),
+                content=f"Question {turn} from session {index}",
+                chain_of_reason=None,
+            )
+            app.messages.value = [*app.messages.value, user_message]
+            async with scheduler.slot(MODEL, context.session_id):
+                messages_to_create = await app.chat_loop(
+                    RoutedClient(chat["id"]),
+                    MODEL,
+                    checkpointer=TurnCheckpointer(message_writer, chat["id"]),
+                )
+
+            started = time.perf_counter()
+            try:
+                await message_writer.save(chat["id"], [user_message, *messages_to_create])
+            except Exception as e:
+                db_errors.append(repr(e))
+            else:
+                db_latencies.append(time.perf_counter() - started)
+        unsubscribe()
+    return updates
+
+
+async def run_level(
+    servers: list[FakeOllamaServer], sessions: int, turns: int, tool_calls: bool
+) -> dict[str, Any]:
+    from deepseek_ollama_solara.database import create_chat
+
+    chats = []
+    for index in range(sessions):
+        chat = await create_chat(f"Benchmark {index}", uuid.uuid4(), MODEL)
+        chats.append(ChatDict(id=chat["id"], title=chat["title"], model=MODEL))
+
+    db_latencies: list[float] = []
+    db_errors: list[str] = []
+    chunks_before = sum(server.chunks_sent for server in servers)
+    chat_requests_before = [_chat_requests(server) for server in servers]
+    for server in servers:
+        server.max_streaming = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    updates = await asyncio.gather(
+        *(
+            _run_session(index, chats[index], turns, tool_calls, db_latencies, db_errors)
+            for index in range(sessions)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tokens = sum(server.chunks_sent for server in servers) - chunks_before
+    return {
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "tokens": tokens,
+        "elapsed_seconds": elapsed,
+        "tokens_per_second": tokens / elapsed,
+        "reactive_updates": sum(updates),
+        "reactive_updates_per_second": sum(updates) / elapsed,
+        "peak_memory_bytes": peak_memory,
+        "db_write_latency_ms": {
+            "mean": statistics.fmean(db_latencies) * 1000 if db_latencies else 0.0,
+            "p50": _percentile(db_latencies, 0.5) * 1000,
+            "p95": _percentile(db_latencies, 0.95) * 1000,
+        },
+        "db_write_errors": len(db_errors),
+        "chat_requests_per_backend": [
+            _chat_requests(server) - before for server, before in zip(servers, chat_requests_before)
+        ],
+        "max_concurrent_streams_per_backend": [server.max_streaming for server in servers],
+    }
+
+
+def _chat_requests(server: FakeOllamaServer) -> int:
+    return sum(path == "/api/chat" for path, _ in server.requests)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    # reactive variables are only scoped per kernel when running under the solara server
+    import solara.server.starlette  # noqa: F401
+
+    from deepseek_ollama_solara import app, tools
+    from deepseek_ollama_solara.database import connect_database, disconnect_database
+    from deepseek_ollama_solara.persistence import message_writer
+
+    tool_call = None
+    if args.tool_calls:
+
+        async def benchmark_lookup(query: str):
+            return {"message": f"Looked up '{query}'", "content": query * 50}
+
+        tools.add_tool(
+            benchmark_lookup,
+            {
+                "type": "function",
+                "function": {
+                    "name": "benchmark_lookup",
+                    "description": "Stand-in tool used by the benchmark",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"query": {"type": "string"}},
+                        "required": ["query"],
+                    },
+                },
+            },
+        )
+        tool_call = {"name": "benchmark_lookup", "arguments": {"query": "benchmark"}}
+
+    script = reasoning_script(args.think_tokens, args.answer_tokens, tool_call=tool_call)
+    async with contextlib.AsyncExitStack() as stack:
+        servers = [
+            await stack.enter_async_context(
+                FakeOllamaServer(script, models=[MODEL], token_rate=args.rate)
+            )
+            for _ in range(args.backends)
+        ]
+        os.environ["OLLAMA_HOSTS"] = ",".join(server.url for server in servers)
+        await connect_database()
+        app.SUPPORTS_TOOLS[MODEL] = True
+        results = [
+            await run_level(servers, sessions, args.turns, args.tool_calls)
+            for sessions in args.sessions
+        ]
+        await message_writer.close()
+        await disconnect_database()
+
+    return {
+        "benchmark": "streaming",
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            "think_tokens": args.think_tokens,
+            "answer_tokens": args.answer_tokens,
+            "rate": args.rate,
+            "tool_calls": args.tool_calls,
+            "backends": args.backends,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--turns", type=int, default=2, help="turns per session")
+    parser.add_argument("--think-tokens", type=int, default=2000)
+    parser.add_argument("--answer-tokens", type=int, default=500)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="tokens per second per stream, 0 is unthrottled"
+    )
+    parser.add_argument("--tool-calls", action="store_true", help="include a tool round per turn")
+    parser.add_argument("--backends", type=int, default=1, help="number of fake Ollama servers")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    # keep the benchmark database away from the real chats.db
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
+import asyncio
 import datetime
 import json
+import time
 import uuid
-from collections.abc import AsyncIterator
+from collections.abc import AsyncGenerator, AsyncIterator
 from typing import List, cast
 
 import solara
@@ -9,146 +11,305 @@ import solara.lab
 from ollama import AsyncClient, ChatResponse
 from ollama._types import ResponseError
 
+from .capabilities import model_capabilities, remove_capability
+from .client import CONNECTION_ERRORS, RoutedClient, list_models
+from .context import build_context
 from .database import (
     connect_database,
     create_chat,
-    create_messages,
     get_chats,
     get_messages,
+    save_turn_metrics,
+    search_messages,
 )
-from .interface import ChatMessage, ChatTitle
-from .tools import tool_callables, tools
+from .interface import ChatMessage, ChatTitle, SearchResults
+from .lifecycle import keep_alive, list_resident_models, warm_up
+from .memory import embedding_model_available, format_recollections, memory_index
+from .persistence import TurnCheckpointer, message_writer
+from .reasoning import reasoning_delimiters
+from .scheduler import QueueFull, scheduler
+from .streaming import StreamAccumulator
+from .telemetry import TurnMetricsRecorder
+from .tools import available_tools, run_tool_calls
 from .types import ChatDict, Message
 
 SUPPORTS_TOOLS: dict[str, bool] = {}
 
+# Number of messages fetched at a time when opening a chat or scrolling up
+MESSAGE_PAGE_SIZE = 50
+# Number of chats fetched at a time for the sidebar, more are fetched as it scrolls
+CHAT_PAGE_SIZE = 50
+# Number of search results fetched at a time
+SEARCH_PAGE_SIZE = 20
+# Seconds of no typing in the search box before searching
+SEARCH_DEBOUNCE = 0.3
+# Number of messages mounted in the transcript, more are mounted as the user scrolls up
+TRANSCRIPT_WINDOW = 30
+# Rounds of tool calls in one turn, and seconds a turn may spend on them. Once either
+# runs out, the model is asked again without tools, so it answers with what it has.
+MAX_TOOL_ROUNDS = 5
+TOOL_TIME_BUDGET = 120
+
+# Reactive variables are scoped to the virtual kernel by the solara server, so every
+# browser session has its own copy. Module-level dicts like SUPPORTS_TOOLS are shared.
 chats: solara.Reactive[List[ChatDict]] = solara.reactive([])
+has_more_chats: solara.Reactive[bool] = solara.reactive(False)
 selected_chat: solara.Reactive[ChatDict | None] = solara.reactive(None)
 messages: solara.Reactive[List[Message]] = solara.reactive([])
 models: solara.Reactive[List[str]] = solara.reactive([])
 current_model: solara.Reactive[str] = solara.reactive("deepseek-r1:8b")
 use_tools: solara.Reactive[bool] = solara.reactive(False)
+has_older_messages: solara.Reactive[bool] = solara.reactive(False)
+transcript_window: solara.Reactive[int] = solara.reactive(TRANSCRIPT_WINDOW)
+context_tokens: solara.Reactive[int | None] = solara.reactive(None)
+queue_position: solara.Reactive[int | None] = solara.reactive(None)
+generation_error: solara.Reactive[str | None] = solara.reactive(None)
+search_terms: solara.Reactive[str] = solara.reactive("")
+search_results: solara.Reactive[list] = solara.reactive([])
+has_more_search_results: solara.Reactive[bool] = solara.reactive(False)
+resident_models: solara.Reactive[List[str]] = solara.reactive([])
 
+# Start of the history sent to the model per chat, kept between turns so the prompt
+# prefix stays the same and Ollama can reuse its prompt cache
+context_starts: dict[uuid.UUID, datetime.datetime | None] = {}
 
-async def init():
-    ai_client = AsyncClient()
-    await connect_database()
-    chats.value = await get_chats()
-    available_models = await ai_client.list()
-    models.value = [model.model for model in available_models.models]
-    for model in available_models.models:
-        if model.model not in SUPPORTS_TOOLS:
-            SUPPORTS_TOOLS[model.model] = True
+# The generation running in each virtual kernel, so it can be stopped when the kernel
+# closes. Solara drops a task's call state before our cleanup runs, so promt_ai.cancel()
+# can't be used there.
+running_generations: dict[str, asyncio.Task] = {}
 
 
-async def process_response(response: AsyncIterator[ChatResponse]) -> list[Message]:
-    thinking = False
-    tool_messages: list[Message] = []
-    assistant_message: Message | None = None
-    async for chunk in response:
-        if chunk.message.tool_calls is not None:
-            for tool_call in chunk.message.tool_calls:
-                tool_callable = tool_callables[tool_call.function.name]
-                tool_result = await tool_callable(**tool_call.function.arguments)  # type: ignore
-                tool_message = Message(
-                    role="tool",
-                    created=datetime.datetime.now(),
-                    content=json.dumps(tool_result),
-                    chain_of_reason=None,
-                )
-                tool_messages.append(tool_message)
-                messages.value = [*messages.value, tool_message]
-            break
+def _cancel_generation_on_close():
+    kernel_id = solara.get_kernel_id()
 
-        # replace the last message element with the appended content
-        delta = chunk.message.content
-        if "<think>" == delta:
-            thinking = True
-            continue
-        if "</think>" == delta:
-            thinking = False
-            continue
-        assert delta is not None
-        created = (
-            assistant_message.created if assistant_message is not None else datetime.datetime.now()
-        )
-        message_content = assistant_message.content if assistant_message is not None else None
-        chain_of_reason = (
-            assistant_message.chain_of_reason if assistant_message is not None else None
-        )
+    def cleanup():
+        task = running_generations.pop(kernel_id, None)
+        if task is not None:
+            task.get_loop().call_soon_threadsafe(task.cancel)
 
-        if thinking:
-            if chain_of_reason is None:
-                chain_of_reason = ""
-            chain_of_reason += delta
-        else:
-            if message_content is None:
-                message_content = ""
-            message_content += delta
-
-        updated_message = Message(
-            role="assistant",
-            created=created,
-            content=message_content,
-            chain_of_reason=chain_of_reason,
-        )
-        # if we don't have an assistant message yet, create one
-        if assistant_message is None:
-            messages.value = [*messages.value, updated_message]
-        else:
-            # replace the last message element with the appended content
-            # which will update the UI
-            messages.value = [*messages.value[:-1], updated_message]
+    return cleanup
 
-        assistant_message = updated_message
 
-        if chunk.done_reason == "stop":
-            break
+solara.lab.on_kernel_start(_cancel_generation_on_close)
 
-    messages_to_create = tool_messages
-    if assistant_message is not None:
-        messages_to_create.append(assistant_message)
-    return messages_to_create
 
+async def init():
+    # connecting and creating the schema only happen for the first session,
+    # the model list is shared between sessions and refreshed periodically
+    await connect_database()
+    chats.value = await get_chats(limit=CHAT_PAGE_SIZE)
+    has_more_chats.value = len(chats.value) == CHAT_PAGE_SIZE
+    available_models = await list_models()
+    models.value = [model.model for model in available_models]
+    # probed from the model metadata, and stored per digest so this is only slow
+    # after pulling a model
+    capabilities = await model_capabilities(available_models)
+    for model in available_models:
+        SUPPORTS_TOOLS[model.model] = "tools" in capabilities.get(model.model, ["tools"])
+    resident_models.value = [model.model for model in await list_resident_models()]
+    memory_index.enabled = embedding_model_available(models.value)
+    if memory_index.enabled:
+        # index messages saved while memory was off, or before it existed
+        memory_index.schedule_sync()
+
+
+def _publish_assistant_message(message: Message, is_new: bool):
+    # replace the last message element with the updated message, which will update the UI
+    if is_new:
+        messages.value = [*messages.value, message]
+    else:
+        messages.value = [*messages.value[:-1], message]
+
+
+async def process_response(
+    response: AsyncIterator[ChatResponse],
+    recorder: TurnMetricsRecorder | None = None,
+    turn_messages: list[Message] | None = None,
+    checkpointer: TurnCheckpointer | None = None,
+    model: str | None = None,
+    tool_deadline: float | None = None,
+) -> list[Message]:
+    # Completed messages are appended to turn_messages, when cancelled the partial
+    # assistant message is added to it marked as truncated
+    if turn_messages is None:
+        turn_messages = []
+    tool_messages: list[Message] = []
+    accumulator = StreamAccumulator(reasoning_delimiters(model))
 
-async def chat_loop(ai_client: AsyncClient, model_to_use: str):
-    # The part below can be replaced with a call to your own
-    response = await ai_client.chat(
-        model=model_to_use,
-        # our MessageDict is compatible with the OpenAI types
-        messages=messages.value,
-        stream=True,
-        tools=tools if (SUPPORTS_TOOLS[model_to_use] and use_tools.value) else None,
-    )
+    def flush():
+        is_new = accumulator.message is None
+        updated_message = accumulator.flush()
+        if updated_message is not None:
+            _publish_assistant_message(updated_message, is_new)
+            if checkpointer is not None:
+                checkpointer.message_updated(updated_message)
 
     try:
-        messages_to_create = await process_response(response)
-    except ResponseError as e:
-        if "does not support tools" in str(e):
+        async for chunk in response:
+            if chunk.message.tool_calls is not None:
+                # make sure the assistant message is complete before the tool results show up
+                flush()
+                tool_results = await run_tool_calls(
+                    chunk.message.tool_calls,
+                    on_tool_finished=recorder.tool_finished if recorder is not None else None,
+                    deadline=tool_deadline,
+                )
+                for tool_result in tool_results:
+                    tool_message = Message(
+                        role="tool",
+                        created=datetime.datetime.now(),
+                        content=json.dumps(tool_result),
+                        chain_of_reason=None,
+                    )
+                    tool_messages.append(tool_message)
+                    if checkpointer is not None:
+                        checkpointer.message_updated(tool_message)
+                messages.value = [*messages.value, *tool_messages]
+                break
+
+            if recorder is not None:
+                recorder.token_received()
+            # servers that recognize the model's chain of thought send it separately
+            if chunk.message.thinking and accumulator.append(chunk.message.thinking, True):
+                flush()
+            if chunk.message.content and accumulator.append_content(chunk.message.content):
+                flush()
+
+            if chunk.done and recorder is not None:
+                recorder.response_done(chunk)
+            if chunk.done_reason == "stop":
+                break
+    except asyncio.CancelledError:
+        accumulator.finish()
+        accumulator.flush()
+        if accumulator.message is not None:
+            turn_messages.append(accumulator.message.model_copy(update={"truncated": True}))
+        raise
+    finally:
+        # closing the stream drops the connection, which makes Ollama stop generating
+        if isinstance(response, AsyncGenerator):
+            await response.aclose()
+
+    accumulator.finish()
+    flush()
+
+    # the assistant message that called the tools comes before their results
+    if accumulator.message is not None:
+        turn_messages.append(accumulator.message)
+    turn_messages.extend(tool_messages)
+    return turn_messages
+
+
+def prompt_messages(model_to_use: str, recalled: str | None = None) -> list[dict]:
+    chat_id = selected_chat.value["id"] if selected_chat.value is not None else None
+    start = context_starts.get(chat_id) if chat_id is not None else None
+    context = build_context(messages.value, model_to_use, start=start, recalled=recalled)
+    if chat_id is not None:
+        context_starts[chat_id] = context["start"]
+    context_tokens.value = context["tokens"]
+    return context["messages"]
+
+
+async def chat_loop(
+    ai_client: AsyncClient | RoutedClient,
+    model_to_use: str,
+    recorder: TurnMetricsRecorder | None = None,
+    turn_messages: list[Message] | None = None,
+    checkpointer: TurnCheckpointer | None = None,
+    recalled: str | None = None,
+) -> list[Message]:
+    if turn_messages is None:
+        turn_messages = []
+    tool_deadline = time.monotonic() + TOOL_TIME_BUDGET
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        offer_tools = (
+            SUPPORTS_TOOLS[model_to_use]
+            and use_tools.value
+            and tool_round < MAX_TOOL_ROUNDS
+            and time.monotonic() < tool_deadline
+        )
+        # tools the model calls anyway are answered with an error rather than run
+        round_deadline = tool_deadline if offer_tools else time.monotonic()
+        if recorder is not None:
+            recorder.request_started()
+        # The part below can be replaced with a call to your own
+        response = await ai_client.chat(
+            model=model_to_use,
+            # our MessageDict is compatible with the OpenAI types
+            messages=prompt_messages(model_to_use, recalled),
+            stream=True,
+            tools=(available_tools() or None) if offer_tools else None,
+            keep_alive=keep_alive(model_to_use),
+        )
+
+        round_start = len(turn_messages)
+        try:
+            await process_response(
+                response, recorder, turn_messages, checkpointer, model_to_use, round_deadline
+            )
+        except ResponseError as e:
+            if "does not support tools" not in str(e):
+                raise
+            # the probe said otherwise, remember it for the next start
             SUPPORTS_TOOLS[model_to_use] = False
+            await remove_capability(model_to_use, "tools")
 
             response = await ai_client.chat(
                 model=model_to_use,
                 # our MessageDict is compatible with the OpenAI types
-                messages=messages.value,
+                messages=prompt_messages(model_to_use, recalled),
                 stream=True,
+                keep_alive=keep_alive(model_to_use),
+            )
+            await process_response(
+                response, recorder, turn_messages, checkpointer, model_to_use, round_deadline
             )
-            messages_to_create = await process_response(response)
 
-    if messages_to_create[-1].role == "tool":
-        messages_to_create += await chat_loop(ai_client=ai_client, model_to_use=model_to_use)
+        # the history, tool results included, is sent again for the model to go on
+        if not any(message.role == "tool" for message in turn_messages[round_start:]):
+            break
 
-    return messages_to_create
+    return turn_messages
 
 
 @solara.lab.task
 async def update_messages():
-    messages.value = await get_messages(selected_chat.value["id"])
+    chat_messages = await get_messages(selected_chat.value["id"], limit=MESSAGE_PAGE_SIZE)
+    messages.value = chat_messages
+    has_older_messages.value = len(chat_messages) == MESSAGE_PAGE_SIZE
+
+
+@solara.lab.task
+async def load_older_messages():
+    if selected_chat.value is None or len(messages.value) == 0:
+        return
+    oldest_message = messages.value[0]
+    older_messages = await get_messages(
+        selected_chat.value["id"],
+        before=(oldest_message["created"], oldest_message["id"]),
+        limit=MESSAGE_PAGE_SIZE,
+    )
+    messages.value = [*older_messages, *messages.value]
+    has_older_messages.value = len(older_messages) == MESSAGE_PAGE_SIZE
+
+
+def session_user() -> str:
+    # generations are queued fairly per browser session
+    try:
+        return solara.get_session_id()
+    except RuntimeError:
+        return "default"
+
+
+def current_kernel_id() -> str:
+    try:
+        return solara.get_kernel_id()
+    except RuntimeError:
+        return "default"
 
 
 @solara.lab.task(prefer_threaded=False)
 async def promt_ai(message: str):
-    ai_client = AsyncClient()
     model_to_use = (
         current_model.value if selected_chat.value is None else selected_chat.value["model"]
     )
@@ -160,18 +321,154 @@ async def promt_ai(message: str):
         selected_chat.value = cast(
             ChatDict, {"id": new_chat["id"], "title": new_chat["title"], "model": new_chat["model"]}
         )
+    # the user may switch chats while this runs
+    chat_id = selected_chat.value["id"]
+    # requests for a chat go to the same server while it is up, see choose_backend
+    ai_client = RoutedClient(chat_id)
 
     messages.value = [*messages.value, user_message]
+    move_chat_to_top(selected_chat.value, user_message.created)
+    generation_error.value = None
+
+    recorder = TurnMetricsRecorder(model_to_use)
+    turn_messages: list[Message] = []
+    # the turn is saved as it streams, so a crash doesn't lose all of it
+    checkpointer = TurnCheckpointer(message_writer, chat_id)
+    kernel_id = current_kernel_id()
+    running_generations[kernel_id] = cast(asyncio.Task, asyncio.current_task())
+    try:
+        recalled = await recall_memory(message, chat_id)
+        async with scheduler.slot(model_to_use, session_user(), on_position=queue_position.set):
+            message_writer.checkpoint(chat_id, user_message)
+            await chat_loop(
+                ai_client=ai_client,
+                model_to_use=model_to_use,
+                recorder=recorder,
+                turn_messages=turn_messages,
+                checkpointer=checkpointer,
+                recalled=recalled,
+            )
+    except QueueFull as e:
+        messages.value = [m for m in messages.value if m is not user_message]
+        generation_error.value = str(e)
+        return
+    except ResponseError as e:
+        # such as a model that isn't installed, or a prompt that doesn't fit. What was
+        # generated before it is kept, like when stopping.
+        await message_writer.save(chat_id, [user_message, *turn_messages])
+        generation_error.value = f"Ollama couldn't answer: {e.error}"
+        return
+    except asyncio.CancelledError:
+        # keep what was generated so far, shielded so that a second cancellation (like
+        # sending the next message right away) doesn't lose it
+        await asyncio.shield(message_writer.save(chat_id, [user_message, *turn_messages]))
+        index = next((i for i, m in enumerate(messages.value) if m is user_message), None)
+        if index is not None:
+            messages.value = [*messages.value[: index + 1], *turn_messages]
+        raise
+    finally:
+        queue_position.value = None
+        running_generations.pop(kernel_id, None)
+
+    persist_started = time.perf_counter()
+    await message_writer.save(chat_id, [user_message, *turn_messages])
+    recorder.persist_duration = time.perf_counter() - persist_started
+    await save_turn_metrics(chat_id, recorder.metrics())
+    if memory_index.enabled:
+        memory_index.schedule_sync()
+
+
+async def recall_memory(question: str, chat_id: uuid.UUID) -> str | None:
+    if not memory_index.enabled:
+        return None
+    # messages of this chat that are in the prompt already aren't recalled
+    loaded_start = messages.value[0]["created"] if messages.value else None
+    before = max(
+        (start for start in (context_starts.get(chat_id), loaded_start) if start is not None),
+        default=None,
+    )
+    try:
+        recollections = await memory_index.recall(question, chat_id, before)
+    except (ResponseError, *CONNECTION_ERRORS):
+        # answering without memory beats not answering
+        return None
+    return format_recollections(recollections) if recollections else None
+
+
+def stop_generation():
+    if promt_ai.pending:
+        promt_ai.cancel()
+
+
+@solara.lab.task
+async def load_more_chats():
+    if len(chats.value) == 0:
+        return
+    last_chat = chats.value[-1]
+    older_chats = await get_chats(
+        before=(last_chat["last_activity"], last_chat["id"]), limit=CHAT_PAGE_SIZE
+    )
+    # a chat can already be listed if it got a message since the first page was loaded
+    loaded = {chat["id"] for chat in chats.value}
+    chats.value = [*chats.value, *(chat for chat in older_chats if chat["id"] not in loaded)]
+    has_more_chats.value = len(older_chats) == CHAT_PAGE_SIZE
+
+
+def move_chat_to_top(chat: ChatDict, last_activity: datetime.datetime):
+    # also adds new chats, and ones that weren't loaded yet
+    moved_chat = next((c for c in chats.value if c["id"] == chat["id"]), chat)
+    chats.value = [
+        cast(ChatDict, {**moved_chat, "last_activity": last_activity}),
+        *(c for c in chats.value if c["id"] != chat["id"]),
+    ]
+
+
+@solara.lab.task
+async def search_chats(load_more: bool = False):
+    if not load_more:
+        # every keystroke starts the task again, which cancels the search waiting here
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+    offset = len(search_results.value) if load_more else 0
+    results = await search_messages(search_terms.value, limit=SEARCH_PAGE_SIZE, offset=offset)
+    search_results.value = [*search_results.value, *results] if load_more else results
+    has_more_search_results.value = len(results) == SEARCH_PAGE_SIZE
+
+
+@solara.lab.task(prefer_threaded=False)
+async def preload_model(model: str, chat_id: uuid.UUID | None = None):
+    await warm_up(model, chat_id)
+    resident_models.value = [str(resident.model) for resident in await list_resident_models()]
+
+
+def select_model(model: str):
+    current_model.set(model)
+    preload_model(model)
+
+
+def open_chat(chat: ChatDict | None):
+    stop_generation()
+    context_tokens.set(None)
+    transcript_window.set(TRANSCRIPT_WINDOW)
+    if chat is None:
+        selected_chat.set(None)
+        messages.set([])
+        has_older_messages.set(False)
+    else:
+        selected_chat.set(chat)
+        update_messages()
+        preload_model(chat["model"], chat["id"])
 
-    messages_to_create = await chat_loop(ai_client=ai_client, model_to_use=model_to_use)
 
-    assert selected_chat.value is not None
-    await create_messages(selected_chat.value["id"], [user_message, *messages_to_create])
+def update_chat_in_sidebar(updated_chat: ChatDict):
+    chats.value = [
+        cast(ChatDict, {**chat, **updated_chat}) if chat["id"] == updated_chat["id"] else chat
+        for chat in chats.value
+    ]
 
 
 @solara.component
 def Page():
-    init_task = solara.lab.use_task(init, dependencies=[selected_chat.value])
+    init_task = solara.lab.use_task(init, dependencies=[], prefer_threaded=False)
     empty_chat = selected_chat.value is None or len(messages.value) == 0
     if init_task.pending:
         with solara.Column(
@@ -188,7 +485,7 @@ def Page():
             },
         ):
             if selected_chat.value is not None:
-                ChatTitle(selected_chat=selected_chat)
+                ChatTitle(selected_chat=selected_chat, on_save=update_chat_in_sidebar)
             if not empty_chat:
                 with solara.lab.ChatBox():
                     if update_messages.pending:
@@ -199,11 +496,37 @@ def Page():
                         else:
                             model_name = selected_chat.value["model"].split(":")[0]
 
-                        for message in messages.value:
-                            ChatMessage(message, model_name)
+                        # only the newest messages are mounted, and every message is keyed
+                        # on its identity, so finished messages keep their rendered widgets
+                        # and only the streaming tail re-renders
+                        visible_messages = messages.value[-transcript_window.value :]
+                        if has_older_messages.value or len(visible_messages) < len(messages.value):
+                            OlderMessagesLoader(visible_messages[0]["created"])
+                        seen_keys: dict[str, int] = {}
+                        for message in visible_messages:
+                            key = message_key(message)
+                            seen_keys[key] = seen_keys.get(key, 0) + 1
+                            ChatMessage(message, model_name).key(f"{key}-{seen_keys[key]}")
             if promt_ai.pending:
-                solara.Text("I'm thinking...", style={"font-size": "1rem", "padding-left": "20px"})
+                if queue_position.value is not None:
+                    solara.Text(
+                        f"Waiting for the model, you are number {queue_position.value} in line...",
+                        style={"font-size": "1rem", "padding-left": "20px"},
+                    )
+                else:
+                    solara.Text(
+                        "I'm thinking...", style={"font-size": "1rem", "padding-left": "20px"}
+                    )
                 solara.ProgressLinear()
+                solara.Button(
+                    label="Stop",
+                    on_click=stop_generation,
+                    icon_name="mdi-stop",
+                    text=True,
+                    style={"align-self": "flex-start"},
+                )
+            if generation_error.value is not None:
+                solara.Warning(generation_error.value)
             # if we don't call .key(..) with a unique key, the ChatInput component will be re-created
             # and we'll lose what we typed.
             chatinput_style = {
@@ -216,15 +539,71 @@ def Page():
             ChatOptions()
 
 
+def message_key(message: Message) -> str:
+    # Messages get their id when they are created, and keep it while they stream and
+    # once they are stored. Role and time can't be used, as several messages, like the
+    # results of parallel tool calls, share them.
+    return str(message["id"])
+
+
+def show_older_messages():
+    hidden_messages = len(messages.value) - transcript_window.value
+    transcript_window.value += TRANSCRIPT_WINDOW
+    # fetch the next page before running out of loaded messages to mount
+    if (
+        hidden_messages < TRANSCRIPT_WINDOW
+        and has_older_messages.value
+        and not load_older_messages.pending
+    ):
+        load_older_messages()
+
+
+@solara.component
+def OlderMessagesLoader(oldest_created: datetime.datetime):
+    # Renders a sentinel at the top of the transcript, which shows older messages
+    # once the user scrolls it into view. Keyed on the oldest visible message, so it
+    # re-arms after every page.
+    def on_visible(visible: bool):
+        if visible:
+            show_older_messages()
+
+    with solara.v.Lazy(v_model=False, on_v_model=on_visible, min_height=24).key(
+        f"older-{oldest_created.isoformat()}"
+    ):
+        solara.Text("Loading older messages...", style={"padding-left": "20px"})
+
+
+@solara.component
+def MoreChatsLoader(last_chat_id: uuid.UUID):
+    # Sentinel at the end of the sidebar, like OlderMessagesLoader for the transcript
+    def on_visible(visible: bool):
+        if visible and not load_more_chats.pending:
+            load_more_chats()
+
+    with solara.v.Lazy(v_model=False, on_v_model=on_visible, min_height=24).key(
+        f"more-chats-{last_chat_id}"
+    ):
+        solara.Text("Loading chats...", style={"padding-left": "16px", "opacity": "0.6"})
+
+
 @solara.component
 def Layout(children=[]):
     def update_selected_chat(value: str | None):
         if value is None:
-            selected_chat.set(None)
-            messages.set([])
+            open_chat(None)
         else:
-            selected_chat.set(next(chat for chat in chats.value if chat["id"] == uuid.UUID(value)))
-            update_messages()
+            open_chat(next(chat for chat in chats.value if chat["id"] == uuid.UUID(value)))
+
+    def update_search_terms(terms: str):
+        search_terms.set(terms)
+        if terms.strip():
+            search_chats()
+        else:
+            search_results.set([])
+            has_more_search_results.set(False)
+
+    def open_search_result(result):
+        open_chat(ChatDict(id=result["chat_id"], title=result["title"], model=result["model"]))
 
     with solara.Row(style={"width": "100%", "height": "100dvh"}, gap=0):
         with solara.v.NavigationDrawer(v_model=True):
@@ -235,19 +614,45 @@ def Layout(children=[]):
                 text=True,
                 icon_name="add",
             )
-            with solara.v.ListItemGroup(
-                v_model=str(selected_chat.value["id"] if selected_chat.value is not None else None),
-                on_v_model=update_selected_chat,
-                style_="max-height: calc(100% - 115px); overflow-y: auto;",
-            ):
-                for chat in chats.value:
-                    with solara.v.ListItem(value=str(chat["id"]), dense=True):
-                        solara.v.ListItemTitle(children=[chat["title"]])
+            solara.InputText(
+                label="Search chats",
+                value=search_terms.value,
+                on_value=update_search_terms,
+                continuous_update=True,
+                style={"padding": "0 16px"},
+            )
+            if search_terms.value.strip():
+                with solara.Div(style={"max-height": "calc(100% - 175px)", "overflow-y": "auto"}):
+                    SearchResults(
+                        search_results.value,
+                        on_select=open_search_result,
+                        on_load_more=(
+                            (lambda: search_chats(load_more=True))
+                            if has_more_search_results.value
+                            else None
+                        ),
+                    )
+            else:
+                with solara.v.ListItemGroup(
+                    v_model=str(
+                        selected_chat.value["id"] if selected_chat.value is not None else None
+                    ),
+                    on_v_model=update_selected_chat,
+                    style_="max-height: calc(100% - 175px); overflow-y: auto;",
+                ):
+                    for chat in chats.value:
+                        with solara.v.ListItem(value=str(chat["id"]), dense=True).key(
+                            str(chat["id"])
+                        ):
+                            solara.v.ListItemTitle(children=[chat["title"]])
+                    if has_more_chats.value:
+                        MoreChatsLoader(chats.value[-1]["id"])
             if len(models.value) > 1:
                 solara.Select(
                     label="Model",
                     values=models.value,
-                    value=current_model,
+                    value=current_model.value,
+                    on_value=select_model,
                     style={
                         "align-self": "flex-end",
                         "position": "absolute",
@@ -269,7 +674,7 @@ def ChatOptions():
         current_model.value if selected_chat.value is None else selected_chat.value["model"]
     )
 
-    with solara.Row():
+    with solara.Row(style={"align-items": "center"}):
         with solara.Tooltip(
             "Using tools (function calling), will disable streaming responses, since Ollama does not support this yet."
             if SUPPORTS_TOOLS[model_in_use]
@@ -281,3 +686,12 @@ def ChatOptions():
                 style={"margin": "0"},
                 disabled=SUPPORTS_TOOLS[model_in_use] is False,
             )
+        if preload_model.pending:
+            solara.Text("Loading model...", style={"font-size": "0.8rem", "opacity": "0.6"})
+        elif model_in_use in resident_models.value:
+            solara.Text("Model loaded", style={"font-size": "0.8rem", "opacity": "0.6"})
+        if context_tokens.value is not None:
+            solara.Text(
+                f"~{context_tokens.value} tokens of context",
+                style={"font-size": "0.8rem", "opacity": "0.6"},
+            )
@@ -0,0 +1,145 @@
+"""Export chats to JSON lines, and import them again.
+
+    deepseek-ollama-solara-backup export chats.jsonl.gz
+    deepseek-ollama-solara-backup import chats.jsonl.gz
+
+Run it from the directory the app runs in, next to chats.db. The file is compressed
+with gzip when its name ends in .gz, and "-" reads from stdin or writes to stdout.
+Rows are streamed in both directions, so memory use doesn't grow with the history.
+"""
+
+import argparse
+import asyncio
+import datetime
+import gzip
+import json
+import sys
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import IO, Any, Literal
+
+from .database import connect_database, disconnect_database, export_rows, import_rows
+from .types import Message
+
+FORMAT_VERSION = 1
+# gzip's default of 9 is several times slower to write for a slightly smaller file
+GZIP_LEVEL = 6
+# Chats and messages inserted per transaction while importing. Each message takes
+# seven of SQLite's 32766 statement parameters.
+IMPORT_BATCH_SIZE = 2000
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+@contextmanager
+def _open(path: str, mode: Literal["r", "w"]) -> Iterator[IO[str]]:
+    if path == "-":
+        yield sys.stdout if mode == "w" else sys.stdin
+    elif path.endswith(".gz"):
+        text_mode: Literal["rt", "wt"] = "wt" if mode == "w" else "rt"
+        with gzip.open(path, text_mode, compresslevel=GZIP_LEVEL, encoding="utf-8") as file:
+            yield file
+    else:
+        with open(path, mode, encoding="utf-8") as file:
+            yield file
+
+
+async def export_chats(file: IO[str]) -> tuple[int, int]:
+    """Writes every chat and message to `file`, returns how many of each."""
+    counts = {"chat": 0, "message": 0}
+    file.write(json.dumps({"type": "export", "version": FORMAT_VERSION}) + "\n")
+    async for kind, row in export_rows():
+        file.write(json.dumps({"type": kind, **row}, default=_json_default) + "\n")
+        counts[kind] += 1
+    return counts["chat"], counts["message"]
+
+
+async def import_chats(file: IO[str]) -> tuple[int, int, int, int]:
+    """Stores the chats and messages in `file` that aren't stored yet.
+
+    Returns how many chats were new, out of how many, and the same for messages.
+    """
+    chat_values: list[dict] = []
+    chat_messages: list[tuple[uuid.UUID, Message]] = []
+    totals = [0, 0, 0, 0]
+
+    async def flush():
+        new_chats, new_messages = await import_rows(chat_values, chat_messages)
+        totals[0] += new_chats
+        totals[1] += len(chat_values)
+        totals[2] += new_messages
+        totals[3] += len(chat_messages)
+        chat_values.clear()
+        chat_messages.clear()
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        kind = record.pop("type", None)
+        if kind == "chat":
+            last_activity = record.get("last_activity")
+            chat_values.append(
+                {
+                    "id": uuid.UUID(record["id"]),
+                    "title": record.get("title"),
+                    "model": record.get("model"),
+                    "last_activity": (
+                        datetime.datetime.fromisoformat(last_activity) if last_activity else None
+                    ),
+                }
+            )
+        elif kind == "message":
+            chat_id = uuid.UUID(record.pop("chat_id"))
+            # messages from before stopping was recorded have no truncated flag
+            record["truncated"] = bool(record.get("truncated"))
+            chat_messages.append((chat_id, Message(**record)))
+        elif kind == "export":
+            if record.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported export version {record.get('version')}")
+        else:
+            raise ValueError(f"Unknown record type {kind!r} on line {line_number}")
+        if len(chat_values) + len(chat_messages) >= IMPORT_BATCH_SIZE:
+            await flush()
+    await flush()
+    return totals[0], totals[1], totals[2], totals[3]
+
+
+async def run(args: argparse.Namespace):
+    await connect_database()
+    try:
+        if args.command == "export":
+            with _open(args.path, "w") as file:
+                chat_count, message_count = await export_chats(file)
+            print(f"Exported {chat_count} chats and {message_count} messages", file=sys.stderr)
+        else:
+            with _open(args.path, "r") as file:
+                new_chats, chat_count, new_messages, message_count = await import_chats(file)
+            print(
+                f"Imported {new_chats} of {chat_count} chats and {new_messages} of "
+                f"{message_count} messages, the rest were stored already",
+                file=sys.stderr,
+            )
+    finally:
+        await disconnect_database()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write all chats to a file")
+    export_parser.add_argument("path", help="file to write, .gz to compress it, - for stdout")
+    import_parser = subparsers.add_parser("import", help="add the chats in a file")
+    import_parser.add_argument("path", help="file to read, .gz if compressed, - for stdin")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
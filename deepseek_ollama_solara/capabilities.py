@@ -0,0 +1,57 @@
+import asyncio
+
+from ollama import ListResponse
+from ollama._types import ResponseError
+
+from .client import choose_backend, list_models
+from .database import get_model_capabilities, save_model_capabilities
+
+# Capabilities are probed once per digest, and kept here after being read from the
+# database so sessions don't have to query it again
+_capabilities: dict[str, list[str]] = {}
+
+
+async def _probe(model: ListResponse.Model) -> list[str] | None:
+    assert model.model is not None and model.digest is not None
+    try:
+        details = await choose_backend(model.model).client().show(model.model)
+    except ResponseError:
+        return None
+    if details.capabilities is not None:
+        capabilities = [str(capability) for capability in details.capabilities]
+    else:
+        # Ollama versions before capabilities were reported decide on tool support
+        # by whether the template renders them
+        capabilities = ["completion"]
+        if details.template is not None and ".Tools" in details.template:
+            capabilities.append("tools")
+    await save_model_capabilities(model.digest, model.model, capabilities)
+    return capabilities
+
+
+async def model_capabilities(models: list[ListResponse.Model]) -> dict[str, list[str]]:
+    """Capabilities per model name, models that couldn't be probed are left out."""
+    models = [model for model in models if model.model is not None and model.digest is not None]
+    unknown = [str(model.digest) for model in models if model.digest not in _capabilities]
+    if unknown:
+        _capabilities.update(await get_model_capabilities(unknown))
+    to_probe = [model for model in models if model.digest not in _capabilities]
+    for model, capabilities in zip(
+        to_probe, await asyncio.gather(*(_probe(model) for model in to_probe))
+    ):
+        if capabilities is not None:
+            _capabilities[str(model.digest)] = capabilities
+    return {
+        str(model.model): _capabilities[str(model.digest)]
+        for model in models
+        if model.digest in _capabilities
+    }
+
+
+async def remove_capability(model_name: str, capability: str):
+    # for when a model turns out not to support something after all
+    for model in await list_models():
+        if model.model == model_name and model.digest is not None:
+            capabilities = _capabilities.get(model.digest, [])
+            _capabilities[model.digest] = [c for c in capabilities if c != capability]
+            await save_model_capabilities(model.digest, model.model, _capabilities[model.digest])
@@ -0,0 +1,281 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Awaitable, Callable, Collection, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar, cast
+
+import httpx
+from ollama import AsyncClient, ChatResponse, ListResponse
+
+# Seconds before the list of available models is fetched from Ollama again
+MODEL_LIST_REFRESH_INTERVAL = 60
+
+# Connection pool shared by every session talking to Ollama
+CLIENT_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+# Ollama servers to spread requests over, as a comma separated list of hosts in this
+# environment variable. Without it, the server from OLLAMA_HOST (or the default) is used.
+HOSTS_VARIABLE = "OLLAMA_HOSTS"
+# Seconds a server that couldn't be reached is skipped for
+BACKEND_RETRY_INTERVAL = 30
+# Generations of a model that each server runs at the same time, Ollama's
+# OLLAMA_NUM_PARALLEL should be at least this. The scheduler queues the generations
+# beyond it, and once every server with the model loaded is this busy, new chats go to
+# servers that still have to load it.
+DEFAULT_MODEL_CONCURRENCY = 1
+MODEL_CONCURRENCY: dict[str, int] = {}
+# Chats remembered in order to keep sending them to the same server
+MAX_PINNED_CHATS = 10_000
+
+# The request never reached the server, so it is safe to send it to another one. The
+# client raises ConnectionError for plain requests, streams raise the httpx error.
+CONNECTION_ERRORS = (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
+
+T = TypeVar("T")
+
+
+class Backend:
+    """An Ollama server, along with what is known about it."""
+
+    def __init__(self, host: str | None):
+        self.host = host
+        self.outstanding = 0
+        # requests in flight per model
+        self.generating: dict[str, int] = {}
+        self.failed_at: float | None = None
+        # None until the server has listed its models
+        self.models: set[str] | None = None
+        self.resident_models: set[str] = set()
+
+    @property
+    def healthy(self) -> bool:
+        return self.failed_at is None or time.monotonic() - self.failed_at > BACKEND_RETRY_INTERVAL
+
+    def has_model(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def has_room(self, model: str) -> bool:
+        return self.generating.get(model, 0) < model_concurrency(model)
+
+    def client(self) -> AsyncClient:
+        return get_ai_client(self.host)
+
+    @contextmanager
+    def request(self, model: str | None = None) -> Iterator[None]:
+        with _lock:
+            self.outstanding += 1
+            if model is not None:
+                self.generating[model] = self.generating.get(model, 0) + 1
+        try:
+            yield
+        finally:
+            with _lock:
+                self.outstanding -= 1
+                if model is not None:
+                    self.generating[model] -= 1
+
+    def mark_failed(self):
+        self.failed_at = time.monotonic()
+
+    def mark_served(self, model: str):
+        self.failed_at = None
+        # Ollama loads a model to serve it
+        self.resident_models.add(model)
+
+
+# httpx clients are bound to the event loop they were created in, so there is one
+# shared client per loop and server rather than one per request
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str | None, AsyncClient]] = (
+    weakref.WeakKeyDictionary()
+)
+
+# Shared by all sessions, which may run on different threads
+_lock = threading.Lock()
+_backends: dict[str | None, Backend] = {}
+_pinned_chats: OrderedDict[uuid.UUID, str | None] = OrderedDict()
+
+_models: list[ListResponse.Model] = []
+_models_fetched_at: float | None = None
+
+
+def model_concurrency(model: str) -> int:
+    return MODEL_CONCURRENCY.get(model, DEFAULT_MODEL_CONCURRENCY)
+
+
+def backends() -> list[Backend]:
+    hosts = [host.strip() for host in os.environ.get(HOSTS_VARIABLE, "").split(",")]
+    with _lock:
+        return [_backends.setdefault(host, Backend(host)) for host in hosts if host] or [
+            _backends.setdefault(None, Backend(None))
+        ]
+
+
+def get_ai_client(host: str | None = None) -> AsyncClient:
+    """Client for `host`, or for the first configured server."""
+    if host is None:
+        host = backends()[0].host
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(host)
+    if client is None:
+        client = AsyncClient(host=host, limits=CLIENT_LIMITS)
+        clients[host] = client
+    return client
+
+
+def choose_backend(
+    model: str, chat_id: uuid.UUID | None = None, exclude: Collection[str | None] = ()
+) -> Backend:
+    """The server to send a request for `model` to.
+
+    A chat stays on the server that last answered it while that server is healthy and
+    has room for another generation of the model, so its prompt cache can be reused.
+    Otherwise servers that have the model loaded and room for it are preferred over
+    ones that only have it, and the one with the fewest requests in flight is picked
+    among them.
+    """
+    candidates = [backend for backend in backends() if backend.host not in exclude]
+    with _lock:
+        if chat_id is not None and chat_id in _pinned_chats:
+            for backend in candidates:
+                if (
+                    backend.host == _pinned_chats[chat_id]
+                    and backend.healthy
+                    and backend.has_room(model)
+                ):
+                    return backend
+        healthy = [backend for backend in candidates if backend.healthy] or candidates
+        with_model = [backend for backend in healthy if backend.has_model(model)] or healthy
+        loaded = [
+            backend
+            for backend in with_model
+            if model in backend.resident_models and backend.has_room(model)
+        ]
+        return min(loaded or with_model, key=lambda backend: backend.outstanding)
+
+
+def serving_backends(model: str) -> int:
+    """How many servers can take a request for `model` right now, at least one."""
+    pool = backends()
+    with _lock:
+        healthy = [backend for backend in pool if backend.healthy] or pool
+        return max(1, sum(backend.has_model(model) for backend in healthy))
+
+
+def pin_chat(chat_id: uuid.UUID | None, backend: Backend):
+    if chat_id is None:
+        return
+    with _lock:
+        _pinned_chats[chat_id] = backend.host
+        _pinned_chats.move_to_end(chat_id)
+        if len(_pinned_chats) > MAX_PINNED_CHATS:
+            _pinned_chats.popitem(last=False)
+
+
+async def on_every_backend(
+    call: Callable[[AsyncClient], Awaitable[T]],
+) -> list[tuple[Backend, T]]:
+    """Runs `call` against every server, leaving out the ones that can't be reached."""
+    pool = backends()
+    results = await asyncio.gather(
+        *(call(backend.client()) for backend in pool), return_exceptions=True
+    )
+    reached: list[tuple[Backend, T]] = []
+    for backend, result in zip(pool, results):
+        if isinstance(result, CONNECTION_ERRORS):
+            backend.mark_failed()
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            reached.append((backend, result))
+    if not reached:
+        raise cast(BaseException, results[0])
+    return reached
+
+
+class RoutedClient:
+    """Sends chat requests to the pool of servers, on behalf of one chat.
+
+    A request that can't reach its server is sent to the next one. A stream that
+    breaks after it started isn't retried, since part of the answer was already shown.
+    """
+
+    def __init__(self, chat_id: uuid.UUID | None = None):
+        self.chat_id = chat_id
+
+    async def chat(self, model: str, stream: bool = False, **kwargs: Any) -> Any:
+        if stream:
+            return self._stream_chat(model, **kwargs)
+        tried: set[str | None] = set()
+        while True:
+            backend = choose_backend(model, self.chat_id, tried)
+            with backend.request(model):
+                try:
+                    response = await backend.client().chat(model=model, **kwargs)
+                except CONNECTION_ERRORS:
+                    if not self._failed(backend, tried):
+                        raise
+                    continue
+            self._served(backend, model)
+            return response
+
+    async def _stream_chat(self, model: str, **kwargs: Any) -> AsyncGenerator[ChatResponse, None]:
+        tried: set[str | None] = set()
+        while True:
+            backend = choose_backend(model, self.chat_id, tried)
+            with backend.request(model):
+                # typed as an AsyncIterator, but the client streams with an async generator
+                response = cast(
+                    AsyncGenerator[ChatResponse, None],
+                    await backend.client().chat(model=model, stream=True, **kwargs),
+                )
+                try:
+                    # the connection is only made when the first part is read
+                    try:
+                        first_part = await response.__anext__()
+                    except CONNECTION_ERRORS:
+                        if not self._failed(backend, tried):
+                            raise
+                        continue
+                    except StopAsyncIteration:
+                        return
+                    self._served(backend, model)
+                    yield first_part
+                    async for part in response:
+                        yield part
+                    return
+                finally:
+                    await response.aclose()
+
+    def _failed(self, backend: Backend, tried: set[str | None]) -> bool:
+        # whether there is another server left to try
+        backend.mark_failed()
+        tried.add(backend.host)
+        return len(tried) < len(backends())
+
+    def _served(self, backend: Backend, model: str):
+        backend.mark_served(model)
+        pin_chat(self.chat_id, backend)
+
+
+async def list_models(refresh: bool = False) -> list[ListResponse.Model]:
+    """Models available on any of the servers."""
+    global _models, _models_fetched_at
+    if (
+        refresh
+        or _models_fetched_at is None
+        or time.monotonic() - _models_fetched_at > MODEL_LIST_REFRESH_INTERVAL
+    ):
+        models: dict[str, ListResponse.Model] = {}
+        for backend, available_models in await on_every_backend(lambda client: client.list()):
+            backend.models = {str(model.model) for model in available_models.models}
+            for model in available_models.models:
+                models.setdefault(str(model.model), model)
+        _models = list(models.values())
+        _models_fetched_at = time.monotonic()
+    return _models
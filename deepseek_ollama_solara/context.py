@@ -0,0 +1,120 @@
+import datetime
+import json
+from collections.abc import Sequence
+from typing import Any
+
+from typing_extensions import TypedDict
+
+from .types import Message
+
+# Number of tokens the history sent to a model may take up
+DEFAULT_CONTEXT_BUDGET = 8192
+CONTEXT_BUDGETS: dict[str, int] = {}
+
+# When the history outgrows the budget, old turns are dropped until it fits in this
+# fraction of the budget. Dropping more than strictly needed keeps the start of the
+# prompt the same for the next few turns, so Ollama's prompt cache keeps hitting.
+CONTEXT_TRIM_RATIO = 0.75
+
+# Tool results from earlier turns are cut down to this many characters of content
+TOOL_RESULT_HISTORY_CHARS = 1000
+
+# Rough conversion used to estimate token counts without a tokenizer
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ContextWindow(TypedDict):
+    messages: list[dict[str, Any]]
+    tokens: int
+    # created timestamp of the first message included, pass it back in on the next
+    # turn to keep the prompt prefix stable
+    start: datetime.datetime | None
+
+
+def context_budget(model: str) -> int:
+    return CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def compact_tool_result(content: str) -> str:
+    # keep the summary line and the start of the payload, this only depends on the
+    # message itself so the compacted form never changes once a turn is over
+    try:
+        tool_result = json.loads(content)
+        payload = tool_result["content"]
+        message = tool_result["message"]
+    except (ValueError, KeyError, TypeError):
+        return content[:TOOL_RESULT_HISTORY_CHARS]
+    if not isinstance(payload, str):
+        payload = json.dumps(payload)
+    if len(payload) > TOOL_RESULT_HISTORY_CHARS:
+        payload = payload[:TOOL_RESULT_HISTORY_CHARS] + " [truncated]"
+    return json.dumps({"message": message, "content": payload})
+
+
+def build_context(
+    history: Sequence[Message],
+    model: str,
+    start: datetime.datetime | None = None,
+    recalled: str | None = None,
+) -> ContextWindow:
+    last_user_index = max(
+        (index for index, message in enumerate(history) if message["role"] == "user"), default=0
+    )
+
+    prompt_messages: list[dict[str, Any]] = []
+    created: list[datetime.datetime] = []
+    tokens: list[int] = []
+    for index, message in enumerate(history):
+        if start is not None and message["created"] < start:
+            continue
+        content = message["content"] or ""
+        # chain of thought is never sent back, and tool results only matter in full
+        # for the turn that requested them
+        if message["role"] == "tool" and index < last_user_index:
+            content = compact_tool_result(content)
+        prompt_messages.append({"role": message["role"], "content": content})
+        created.append(message["created"])
+        tokens.append(estimate_tokens(content))
+
+    total = sum(tokens)
+    if total > context_budget(model):
+        # drop whole turns from the start until the rest fits, but never the current turn
+        turn_starts = [
+            i
+            for i, prompt_message in enumerate(prompt_messages)
+            if prompt_message["role"] == "user"
+        ]
+        target = context_budget(model) * CONTEXT_TRIM_RATIO
+        cut = turn_starts[-1] if turn_starts else 0
+        remaining = total
+        previous_start = 0
+        for turn_start in turn_starts:
+            remaining -= sum(tokens[previous_start:turn_start])
+            previous_start = turn_start
+            if remaining <= target:
+                cut = turn_start
+                break
+        prompt_messages = prompt_messages[cut:]
+        created = created[cut:]
+        total = sum(tokens[cut:])
+
+    if recalled is not None:
+        # just before the question rather than at the start, so the rest of the prompt
+        # stays the same between turns
+        last_user = max(
+            (i for i, message in enumerate(prompt_messages) if message["role"] == "user"),
+            default=len(prompt_messages),
+        )
+        prompt_messages.insert(last_user, {"role": "system", "content": recalled})
+        total += estimate_tokens(recalled)
+
+    return ContextWindow(
+        messages=prompt_messages,
+        tokens=total,
+        start=created[0] if created else start,
+    )
@@ -1,16 +1,70 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import threading
 import uuid
+import zlib
+from collections.abc import AsyncIterator, Sequence
 
 from databases import Database
-from sqlalchemy import UUID, Column, DateTime, MetaData, String, Table, create_engine
+from sqlalchemy import (
+    UUID,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    case,
+    cast,
+    column,
+    create_engine,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+    tuple_,
+    type_coerce,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 
-from .types import Message
+from .types import Message, TurnMetrics
 
 DATABASE_URL = "sqlite:///./chats.db"
 
-database = Database(DATABASE_URL)
-metadata = MetaData()
+# Run on every new connection. The database is in WAL mode (set in _create_schema),
+# so reads don't wait for writes, and synchronous=NORMAL is safe from corruption in
+# that mode. busy_timeout makes concurrent writers wait for each other instead of
+# failing with "database is locked".
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for pragma in SQLITE_PRAGMAS:
+            self.execute(pragma)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+# extra options are passed on to sqlite3.connect by both libraries
+database = Database(DATABASE_URL, factory=_SQLiteConnection)
+metadata = MetaData()
 
 chats = Table(
     "chats",
@@ -18,8 +72,11 @@ chats = Table(
     Column("title", String),
     Column("model", String),
     Column("id", UUID, primary_key=True, nullable=False, server_default="gen_random_uuid()"),
+    Column("last_activity", DateTime, nullable=True),
 )
 
+Index("ix_chats_last_activity_id", chats.c.last_activity, chats.c.id)
+
 messages = Table(
     "messages",
     metadata,
@@ -27,27 +84,287 @@ messages = Table(
     Column("chat_id", UUID),
     Column("created", DateTime, server_default="now()"),
     Column("content", String),
-    Column("chain_of_reason", String, nullable=True),
+    Column("reasoning_length", Integer, nullable=True),
     Column("role", String),
+    Column("truncated", Boolean, nullable=True),
+)
+
+# Chain of thought is often several times longer than the answer and mostly never
+# read, so it is kept apart from the messages and only loaded when it is shown
+reasoning = Table(
+    "reasoning",
+    metadata,
+    Column("message_id", UUID, primary_key=True),
+    Column("text", LargeBinary),
+    Column("compressed", Boolean),
+)
+
+# Store reasoning zlib-compressed, already stored reasoning is read either way
+COMPRESS_REASONING = True
+
+Index("ix_messages_chat_id_created", messages.c.chat_id, messages.c.created)
+
+# Messages in the semantic memory index, `row` is the message's row in the vector file
+memory = Table(
+    "memory",
+    metadata,
+    Column("row", Integer, primary_key=True, autoincrement=False),
+    Column("message_id", UUID, nullable=False, unique=True),
+)
+
+tool_results = Table(
+    "tool_results",
+    metadata,
+    Column("key", String, primary_key=True),
+    Column("tool", String),
+    Column("created", DateTime),
+    Column("result", String),
+)
+
+# What each model supports according to Ollama, keyed by digest so a model that is
+# pulled again gets probed again
+model_capabilities = Table(
+    "model_capabilities",
+    metadata,
+    Column("digest", String, primary_key=True),
+    Column("model", String),
+    Column("capabilities", String),
+    Column("created", DateTime),
+)
+
+# Full-text index over user and assistant messages. SQLAlchemy can't create FTS5
+# tables, so it is created in _create_schema and only described here for queries.
+messages_fts = table(
+    "messages_fts",
+    column("content", String),
+    column("chain_of_reason", String),
+    column("message_id", UUID),
+    column("chat_id", UUID),
+)
+
+# Also make reasoning traces searchable, at the cost of a much larger index
+SEARCH_CHAIN_OF_REASON = False
+SEARCHABLE_ROLES = ("user", "assistant")
+# Prefix lengths FTS5 keeps an index for, so the prefix search while typing doesn't
+# have to scan every term that starts with the prefix. Shorter prefixes aren't
+# searched, since they match most of the index.
+SEARCH_PREFIX_LENGTHS = (2, 3)
+# Matches are ranked this many at a time, newest first, so common words stay fast
+SEARCH_MAX_MATCHES = 1000
+
+turn_metrics = Table(
+    "turn_metrics",
+    metadata,
+    Column("id", UUID, primary_key=True),
+    Column("chat_id", UUID),
+    Column("model", String),
+    Column("created", DateTime),
+    Column("time_to_first_token", Float, nullable=True),
+    Column("tokens_per_second", Float, nullable=True),
+    Column("prompt_tokens", Integer, nullable=True),
+    Column("eval_tokens", Integer, nullable=True),
+    Column("load_duration", Float, nullable=True),
+    Column("tool_latencies", String),
+    Column("persist_duration", Float, nullable=True),
+)
+
+Index("ix_turn_metrics_model_created", turn_metrics.c.model, turn_metrics.c.created)
+
+# Columns of turn_metrics that get_model_performance reports percentiles for
+PERFORMANCE_METRICS = (
+    "time_to_first_token",
+    "tokens_per_second",
+    "prompt_tokens",
+    "load_duration",
+    "persist_duration",
 )
 
 
+_schema_created = False
+# the schema is created on a worker thread, see connect_database
+_schema_lock = threading.Lock()
+# synchronous engine for exports and imports, see import_rows
+_bulk_engine: Engine | None = None
+
+
+def _create_engine() -> Engine:
+    return create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False, "factory": _SQLiteConnection}
+    )
+
+
+def _get_bulk_engine() -> Engine:
+    global _bulk_engine
+    if _bulk_engine is None:
+        _bulk_engine = _create_engine()
+    return _bulk_engine
+
+
+def _create_schema():
+    global _schema_created
+    with _schema_lock:
+        if not _schema_created:
+            _migrate_schema()
+            _schema_created = True
+
+
+def _migrate_schema():
+    # only used to create the schema, so it is made here rather than on import
+    engine = _create_engine()
+    # the journal mode can't be changed inside a transaction, and is stored in the file
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        # nor does it add columns to existing tables
+        inspector = inspect(connection)
+        for table in metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.execute(
+                        text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                    )
+        # create_all only creates indexes along with new tables, so add the ones
+        # missing from databases created by an older version
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        _move_reasoning(connection)
+        _backfill_last_activity(connection)
+        _create_search_index(connection)
+    engine.dispose()
+
+
+def _move_reasoning(connection):
+    # older versions kept the reasoning in a chain_of_reason column of messages
+    if "chain_of_reason" not in {c["name"] for c in inspect(connection).get_columns("messages")}:
+        return
+    legacy_messages = table(
+        "messages",
+        column("id", UUID),
+        column("chain_of_reason", String),
+        column("reasoning_length", Integer),
+    )
+    with_reasoning = legacy_messages.c.chain_of_reason.is_not(None)
+    # copied within SQLite, so uncompressed, stored reasoning is read either way
+    connection.execute(
+        reasoning.insert().from_select(
+            ["message_id", "text", "compressed"],
+            select(
+                legacy_messages.c.id,
+                cast(legacy_messages.c.chain_of_reason, LargeBinary),
+                literal(False),
+            ).where(with_reasoning),
+        )
+    )
+    connection.execute(
+        legacy_messages.update()
+        .where(with_reasoning)
+        .values(reasoning_length=func.length(legacy_messages.c.chain_of_reason))
+    )
+    connection.execute(text("ALTER TABLE messages DROP COLUMN chain_of_reason"))
+
+
+def _backfill_last_activity(connection):
+    # chats from before the column existed, those without messages go last
+    latest_message = (
+        select(func.max(messages.c.created)).where(messages.c.chat_id == chats.c.id)
+    ).scalar_subquery()
+    connection.execute(
+        chats.update()
+        .where(chats.c.last_activity.is_(None))
+        .values(last_activity=func.coalesce(latest_message, datetime.datetime(1970, 1, 1)))
+    )
+
+
+def _create_search_index(connection):
+    prefix = "prefix='{}'".format(" ".join(map(str, SEARCH_PREFIX_LENGTHS)))
+    existing = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+    ).scalar()
+    if existing is not None:
+        if prefix in existing:
+            return
+        # made without these prefix indexes, which can only be added by rebuilding it
+        connection.execute(text("DROP TABLE messages_fts"))
+    connection.execute(
+        text(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, chain_of_reason, message_id UNINDEXED, chat_id UNINDEXED, "
+            f"tokenize='unicode61 remove_diacritics 2', {prefix})"
+        )
+    )
+    # backfill messages stored before the index existed, oldest first so that rowids
+    # follow the order messages were written in, like they do for new messages
+    chain_of_reason = literal(None, String)
+    searchable = messages
+    if SEARCH_CHAIN_OF_REASON:
+        # reasoning may be compressed, which only Python can undo
+        connection.connection.driver_connection.create_function(
+            "reasoning_text",
+            2,
+            lambda data, compressed: None if data is None else _reasoning_text(data, compressed),
+            deterministic=True,
+        )
+        chain_of_reason = func.reasoning_text(reasoning.c.text, reasoning.c.compressed)
+        searchable = messages.outerjoin(reasoning, reasoning.c.message_id == messages.c.id)
+    connection.execute(
+        messages_fts.insert().from_select(
+            ["content", "chain_of_reason", "message_id", "chat_id"],
+            select(messages.c.content, chain_of_reason, messages.c.id, messages.c.chat_id)
+            .select_from(searchable)
+            .where(messages.c.role.in_(SEARCHABLE_ROLES))
+            .order_by(messages.c.created),
+        )
+    )
+
+
+def _reasoning_values(message_id: uuid.UUID, chain_of_reason: str) -> dict:
+    data = chain_of_reason.encode()
+    if COMPRESS_REASONING:
+        data = zlib.compress(data)
+    return {"message_id": message_id, "text": data, "compressed": COMPRESS_REASONING}
+
+
+def _reasoning_text(data: bytes, compressed: bool) -> str:
+    return (zlib.decompress(data) if compressed else data).decode()
+
+
 async def connect_database():
     await database.connect()
-    metadata.create_all(engine)
+    # migrating a large database takes a while, keep it off the event loop
+    await asyncio.to_thread(_create_schema)
 
 
 async def disconnect_database():
+    global _bulk_engine
     await database.disconnect()
+    if _bulk_engine is not None:
+        _bulk_engine.dispose()
+        _bulk_engine = None
 
 
-async def get_chats():
-    query = chats.select()
+async def get_chats(
+    before: tuple[datetime.datetime, uuid.UUID] | None = None, limit: int | None = None
+):
+    # Returns chats with the most recent activity first. The next page starts after
+    # the (last_activity, id) of the last chat loaded so far.
+    query = chats.select().order_by(chats.c.last_activity.desc(), chats.c.id.desc())
+    if before is not None:
+        query = query.where(tuple_(chats.c.last_activity, chats.c.id) < tuple_(*before))
+    if limit is not None:
+        query = query.limit(limit)
     return await database.fetch_all(query)
 
 
 async def create_chat(title: str, uuid: uuid.UUID, model: str):
-    query = chats.insert().values(title=title, id=uuid, model=model).returning(*chats.c)
+    query = (
+        chats.insert()
+        .values(title=title, id=uuid, model=model, last_activity=datetime.datetime.now())
+        .returning(*chats.c)
+    )
     return await database.fetch_one(query)
 
 
@@ -56,25 +373,453 @@ async def update_chat(id: uuid.UUID, title: str):
     return await database.execute(query)
 
 
-async def get_messages(id: str):
-    query = messages.select().where(messages.c.chat_id == id)
+async def get_messages(
+    chat_id: uuid.UUID,
+    before: tuple[datetime.datetime, uuid.UUID] | None = None,
+    limit: int | None = None,
+):
+    # Returns messages in chronological order. With a limit, only the newest `limit`
+    # messages before `before` are returned, so older pages can be fetched by passing
+    # the (created, id) of the oldest message loaded so far.
+    query = messages.select().where(messages.c.chat_id == chat_id)
+    if before is not None:
+        query = query.where(tuple_(messages.c.created, messages.c.id) < tuple_(*before))
+    if limit is None:
+        return await database.fetch_all(query.order_by(messages.c.created, messages.c.id))
+
+    query = query.order_by(messages.c.created.desc(), messages.c.id.desc()).limit(limit)
     chat_messages = await database.fetch_all(query)
-    chat_messages.sort(key=lambda x: x["created"])
+    chat_messages.reverse()
     return chat_messages
 
 
+def _message_values(chat_id: uuid.UUID, message: Message) -> dict:
+    return {
+        "chat_id": chat_id,
+        "id": message.id,
+        "role": message.role,
+        "created": message.created,
+        "content": message.content,
+        "reasoning_length": message.reasoning_length,
+        "truncated": message.truncated,
+    }
+
+
+def _search_values(chat_messages: list[tuple[uuid.UUID, Message]]) -> list[dict]:
+    return [
+        {
+            "content": message.content,
+            "chain_of_reason": message.chain_of_reason if SEARCH_CHAIN_OF_REASON else None,
+            "message_id": message.id,
+            "chat_id": chat_id,
+        }
+        for chat_id, message in chat_messages
+        if message.role in SEARCHABLE_ROLES
+    ]
+
+
+def _latest_activity(
+    chat_messages: list[tuple[uuid.UUID, Message]],
+) -> dict[uuid.UUID, datetime.datetime]:
+    last_activity: dict[uuid.UUID, datetime.datetime] = {}
+    for chat_id, message in chat_messages:
+        last_activity[chat_id] = max(message.created, last_activity.get(chat_id, message.created))
+    return last_activity
+
+
+async def _update_last_activity(chat_messages: list[tuple[uuid.UUID, Message]]):
+    for chat_id, activity in _latest_activity(chat_messages).items():
+        await database.execute(
+            chats.update()
+            .where(
+                chats.c.id == chat_id,
+                or_(chats.c.last_activity.is_(None), chats.c.last_activity < activity),
+            )
+            .values(last_activity=activity)
+        )
+
+
+async def save_messages(chat_messages: list[tuple[uuid.UUID, Message]], search_index: bool = True):
+    """Inserts messages, or updates them if they were saved before, in one transaction.
+
+    Messages are added to the search index when `search_index` is set, which should
+    happen only once per message, when it is complete.
+    """
+    if not chat_messages:
+        return
+    query = sqlite_insert(messages).values(
+        [_message_values(chat_id, message) for chat_id, message in chat_messages]
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[messages.c.id],
+        set_={
+            "content": query.excluded.content,
+            "reasoning_length": query.excluded.reasoning_length,
+            "truncated": query.excluded.truncated,
+        },
+    )
+    reasoning_values = [
+        _reasoning_values(message.id, message.chain_of_reason)
+        for _, message in chat_messages
+        if message.chain_of_reason is not None
+    ]
+    search_values = _search_values(chat_messages)
+    async with database.transaction():
+        await database.execute(query)
+        await _update_last_activity(chat_messages)
+        if reasoning_values:
+            reasoning_query = sqlite_insert(reasoning).values(reasoning_values)
+            reasoning_query = reasoning_query.on_conflict_do_update(
+                index_elements=[reasoning.c.message_id],
+                set_={
+                    "text": reasoning_query.excluded.text,
+                    "compressed": reasoning_query.excluded.compressed,
+                },
+            )
+            await database.execute(reasoning_query)
+        if search_index and search_values:
+            await database.execute(messages_fts.insert().values(search_values))
+
+
+async def get_reasoning(message_id: uuid.UUID) -> str | None:
+    row = await database.fetch_one(reasoning.select().where(reasoning.c.message_id == message_id))
+    return _reasoning_text(row["text"], row["compressed"]) if row is not None else None
+
+
 async def create_messages(chat_id: uuid.UUID, message_list: list[Message]):
-    message_values = []
-    for message in message_list:
-        message_values.append(
-            {
-                "chat_id": chat_id,
-                "id": uuid.uuid4(),
-                "role": message.role,
-                "created": message.created,
-                "content": message.content,
-                "chain_of_reason": message.chain_of_reason,
-            }
+    return await save_messages([(chat_id, message) for message in message_list])
+
+
+async def export_rows(batch_size: int = 1000) -> AsyncIterator[tuple[str, dict]]:
+    """Every chat, then every message with its reasoning, as ("chat" | "message", row).
+
+    Rows are read `batch_size` at a time as they are consumed, and in one transaction,
+    so messages saved meanwhile don't refer to chats left out.
+    """
+    message_query = select(
+        *(column for column in messages.c if column.name != "reasoning_length"),
+        reasoning.c.text,
+        reasoning.c.compressed,
+    ).select_from(messages.outerjoin(reasoning, reasoning.c.message_id == messages.c.id))
+    # like imports, this skips databases, whose per row overhead is most of the work
+    connection = await asyncio.to_thread(_get_bulk_engine().connect)
+    try:
+        # pysqlite only starts transactions before writes
+        await asyncio.to_thread(connection.exec_driver_sql, "BEGIN")
+        for kind, query in (("chat", chats.select()), ("message", message_query)):
+            result = await asyncio.to_thread(
+                connection.execution_options(yield_per=batch_size).execute, query
+            )
+            while rows := await asyncio.to_thread(result.fetchmany, batch_size):
+                for row in rows:
+                    values = dict(row._mapping)
+                    if kind == "message":
+                        data = values.pop("text")
+                        compressed = values.pop("compressed")
+                        values["chain_of_reason"] = (
+                            _reasoning_text(data, compressed) if data is not None else None
+                        )
+                    yield kind, values
+    finally:
+        await asyncio.to_thread(connection.close)
+
+
+async def import_rows(
+    chat_values: list[dict], chat_messages: list[tuple[uuid.UUID, Message]]
+) -> tuple[int, int]:
+    """Inserts the chats and messages that aren't stored yet, in one transaction.
+
+    Chats and messages whose id is stored already are skipped rather than updated.
+    Returns how many chats and messages were new.
+    """
+    # databases compiles a statement for every set of values, which takes far longer
+    # than inserting them, so imports go through SQLAlchemy's executemany instead
+    return await asyncio.to_thread(_import_rows, chat_values, chat_messages)
+
+
+def _import_rows(
+    chat_values: list[dict], chat_messages: list[tuple[uuid.UUID, Message]]
+) -> tuple[int, int]:
+    with _get_bulk_engine().begin() as connection:
+        new_chats = 0
+        if chat_values:
+            query = (
+                sqlite_insert(chats)
+                .on_conflict_do_nothing(index_elements=[chats.c.id])
+                .returning(type_coerce(chats.c.id, String))
+            )
+            new_chats = len(connection.execute(query, chat_values).all())
+        if not chat_messages:
+            return new_chats, 0
+        query = (
+            sqlite_insert(messages)
+            .on_conflict_do_nothing(index_elements=[messages.c.id])
+            # compared as stored: UUID columns have numeric affinity in SQLite, so the
+            # odd id that looks like a number is stored as one and can't be read back
+            .returning(type_coerce(messages.c.id, String))
+        )
+        message_values = [_message_values(chat_id, message) for chat_id, message in chat_messages]
+        inserted = set(connection.execute(query, message_values).scalars())
+        # only the first of messages repeated within the batch was inserted
+        new_messages = []
+        for chat_id, message in chat_messages:
+            if message.id.hex in inserted:
+                inserted.remove(message.id.hex)
+                new_messages.append((chat_id, message))
+        if not new_messages:
+            return new_chats, 0
+        reasoning_values = [
+            _reasoning_values(message.id, message.chain_of_reason)
+            for _, message in new_messages
+            if message.chain_of_reason is not None
+        ]
+        if reasoning_values:
+            connection.execute(
+                sqlite_insert(reasoning).on_conflict_do_nothing(
+                    index_elements=[reasoning.c.message_id]
+                ),
+                reasoning_values,
+            )
+        search_values = _search_values(new_messages)
+        if search_values:
+            connection.execute(messages_fts.insert(), search_values)
+        connection.execute(
+            chats.update()
+            .where(
+                chats.c.id == bindparam("chat_id"),
+                or_(
+                    chats.c.last_activity.is_(None),
+                    chats.c.last_activity < bindparam("activity"),
+                ),
+            )
+            .values(last_activity=bindparam("activity")),
+            [
+                {"chat_id": chat_id, "activity": activity}
+                for chat_id, activity in _latest_activity(new_messages).items()
+            ],
         )
-    query = messages.insert().values(message_values)
+    return new_chats, len(new_messages)
+
+
+def search_query(terms: str) -> str | None:
+    # Turn user input into an FTS5 query: every word has to match, the last one as a
+    # prefix so results show up while typing. Quoting keeps FTS5 syntax characters inert.
+    words = [word.replace('"', "") for word in terms.split()]
+    words = [word for word in words if word]
+    if not words:
+        return None
+    if len(words[-1]) < min(SEARCH_PREFIX_LENGTHS):
+        # still being typed, and too short a prefix to look up
+        words = words[:-1]
+        return " ".join(f'"{word}"' for word in words) if words else None
+    return " ".join([*(f'"{word}"' for word in words[:-1]), f'"{words[-1]}"*'])
+
+
+async def search_messages(terms: str, limit: int = 20, offset: int = 0):
+    """Messages matching `terms`, the best matches among the newest ones first.
+
+    Matches are ranked in windows of SEARCH_MAX_MATCHES, newest window first, so
+    paging past the first window goes on with the best of the older matches.
+    """
+    match = search_query(terms)
+    if match is None:
+        return []
+    results: list = []
+    while len(results) < limit:
+        window, position = divmod(offset + len(results), SEARCH_MAX_MATCHES)
+        count = min(limit - len(results), SEARCH_MAX_MATCHES - position)
+        page = await _search_window(match, window, position, count)
+        results.extend(page)
+        if len(page) < count:
+            # the window wasn't full, so there are no older matches
+            break
+    return results
+
+
+async def _search_window(match: str, window: int, offset: int, limit: int):
+    # Ranking by FTS5's bm25 score means scoring every match, which takes seconds for
+    # a word in most messages of a large history. Only a window of matches is ranked,
+    # newest by rowid, which FTS5 reads in order without sorting.
+    window_matches = (
+        select(
+            messages_fts.c.message_id,
+            messages_fts.c.chat_id,
+            literal_column("rank").label("rank"),
+            func.snippet(literal_column("messages_fts"), 0, "", "", "…", 16).label("snippet"),
+        )
+        .where(literal_column("messages_fts").op("MATCH")(match))
+        .order_by(literal_column("messages_fts.rowid").desc())
+        .limit(SEARCH_MAX_MATCHES)
+        .offset(window * SEARCH_MAX_MATCHES)
+        .subquery()
+    )
+    query = (
+        select(
+            window_matches.c.message_id,
+            window_matches.c.chat_id,
+            chats.c.title,
+            chats.c.model,
+            messages.c.created,
+            messages.c.role,
+            window_matches.c.snippet,
+        )
+        .select_from(window_matches)
+        .join(chats, chats.c.id == window_matches.c.chat_id)
+        .join(messages, messages.c.id == window_matches.c.message_id)
+        .order_by(window_matches.c.rank, messages.c.created.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return await database.fetch_all(query)
+
+
+async def get_unindexed_messages(roles: Sequence[str], after: int, limit: int):
+    # finished messages stored after the message with rowid `after`, in the order they
+    # were stored, so each batch starts where the last one ended instead of scanning
+    rowid = literal_column("messages.rowid", Integer)
+    query = (
+        select(rowid.label("rowid"), messages.c.id, messages.c.content)
+        .where(
+            rowid > after,
+            messages.c.role.in_(roles),
+            or_(messages.c.truncated.is_(None), messages.c.truncated.is_(False)),
+        )
+        .order_by(rowid)
+        .limit(limit)
+    )
+    return await database.fetch_all(query)
+
+
+async def get_last_indexed_message() -> int:
+    # rowid of the message added to the memory index last, 0 if it is empty
+    query = (
+        select(literal_column("messages.rowid", Integer))
+        .select_from(memory.join(messages, memory.c.message_id == messages.c.id))
+        .order_by(memory.c.row.desc())
+        .limit(1)
+    )
+    return await database.fetch_val(query) or 0
+
+
+async def get_memory_size() -> int:
+    return await database.fetch_val(select(func.coalesce(func.max(memory.c.row) + 1, 0)))
+
+
+async def save_memory_rows(rows: list[tuple[int, uuid.UUID]]):
+    if rows:
+        query = memory.insert().values([{"row": row, "message_id": id} for row, id in rows])
+        await database.execute(query)
+
+
+async def get_memory_messages(rows: list[int]):
+    query = (
+        select(
+            memory.c.row,
+            messages.c.chat_id,
+            messages.c.role,
+            messages.c.created,
+            messages.c.content,
+            chats.c.title,
+        )
+        .select_from(
+            memory.join(messages, messages.c.id == memory.c.message_id).join(
+                chats, chats.c.id == messages.c.chat_id
+            )
+        )
+        .where(memory.c.row.in_(rows))
+    )
+    return await database.fetch_all(query)
+
+
+async def clear_memory():
+    await database.execute(memory.delete())
+
+
+async def get_tool_result(
+    key: str, created_after: datetime.datetime
+) -> tuple[str, datetime.datetime] | None:
+    """The stored result for `key` and when it was stored, if it is newer than `created_after`."""
+    query = tool_results.select().where(
+        tool_results.c.key == key, tool_results.c.created > created_after
+    )
+    row = await database.fetch_one(query)
+    return (row["result"], row["created"]) if row is not None else None
+
+
+async def save_tool_result(key: str, tool: str, result: str, created: datetime.datetime):
+    query = sqlite_insert(tool_results).values(key=key, tool=tool, result=result, created=created)
+    query = query.on_conflict_do_update(
+        index_elements=[tool_results.c.key], set_={"result": result, "created": created}
+    )
+    return await database.execute(query)
+
+
+async def delete_tool_results(created_before: datetime.datetime):
+    query = tool_results.delete().where(tool_results.c.created <= created_before)
+    return await database.execute(query)
+
+
+async def get_model_capabilities(digests: list[str]) -> dict[str, list[str]]:
+    query = model_capabilities.select().where(model_capabilities.c.digest.in_(digests))
+    rows = await database.fetch_all(query)
+    return {row["digest"]: json.loads(row["capabilities"]) for row in rows}
+
+
+async def save_model_capabilities(digest: str, model: str, capabilities: list[str]):
+    values = {
+        "model": model,
+        "capabilities": json.dumps(capabilities),
+        "created": datetime.datetime.now(),
+    }
+    query = sqlite_insert(model_capabilities).values(digest=digest, **values)
+    query = query.on_conflict_do_update(index_elements=[model_capabilities.c.digest], set_=values)
+    return await database.execute(query)
+
+
+async def save_turn_metrics(chat_id: uuid.UUID, metrics: TurnMetrics):
+    query = turn_metrics.insert().values(
+        id=uuid.uuid4(),
+        chat_id=chat_id,
+        **{**metrics, "tool_latencies": json.dumps(metrics["tool_latencies"])},
+    )
     return await database.execute(query)
+
+
+async def get_metric_percentiles(
+    metric: str, since: datetime.datetime | None = None, fractions: tuple[float, ...] = (0.5, 0.95)
+):
+    # nearest-rank percentiles per model, computed in SQL with window functions
+    column = turn_metrics.c[metric]
+    ranking = select(
+        turn_metrics.c.model,
+        column.label("value"),
+        func.row_number().over(partition_by=turn_metrics.c.model, order_by=column).label("rank"),
+        func.count().over(partition_by=turn_metrics.c.model).label("total"),
+    ).where(column.is_not(None))
+    if since is not None:
+        ranking = ranking.where(turn_metrics.c.created >= since)
+    ranked = ranking.subquery()
+    query = select(
+        ranked.c.model,
+        func.count().label("turns"),
+        *(
+            func.min(case((ranked.c.rank >= ranked.c.total * fraction, ranked.c.value))).label(
+                f"p{round(fraction * 100)}"
+            )
+            for fraction in fractions
+        ),
+    ).group_by(ranked.c.model)
+    return await database.fetch_all(query)
+
+
+async def get_model_performance(since: datetime.datetime | None = None):
+    # {model: {metric: {"turns": ..., "p50": ..., "p95": ...}}}
+    performance: dict[str, dict[str, dict[str, float]]] = {}
+    for metric in PERFORMANCE_METRICS:
+        for row in await get_metric_percentiles(metric, since):
+            performance.setdefault(row["model"], {})[metric] = {
+                "turns": row["turns"],
+                "p50": row["p50"],
+                "p95": row["p95"],
+            }
+    return performance
@@ -1,13 +1,47 @@
 import json
-from typing import Callable
+from typing import Any, Callable
 
 import solara
 from reacton.ipyvuetify import use_event
 
-from .database import update_chat
+from .database import get_reasoning, update_chat
 from .types import ChatDict, Message
 
 
+@solara.component
+def StoredReasoning(message_id):
+    async def load():
+        return await get_reasoning(message_id)
+
+    reasoning = solara.lab.use_task(load, dependencies=[message_id])
+    if reasoning.finished:
+        solara.Markdown(reasoning.value or "")
+    else:
+        solara.ProgressLinear(True)
+
+
+@solara.component
+def ChainOfThought(message: Message):
+    # unlike solara.Details, the content is only created once the panel is opened
+    expanded = solara.use_reactive(False)
+
+    def on_v_model(value):
+        expanded.set(value == 0)
+
+    with solara.v.ExpansionPanels(v_model=0 if expanded.value else None, on_v_model=on_v_model):
+        with solara.v.ExpansionPanel():
+            solara.v.ExpansionPanelHeader(
+                children=[f"Chain of Thought ({message['reasoning_length']:,} characters)"]
+            )
+            with solara.v.ExpansionPanelContent():
+                if expanded.value:
+                    # messages of the current session still have it in memory
+                    if isinstance(message, Message) and message.chain_of_reason is not None:
+                        solara.Markdown(message.chain_of_reason)
+                    else:
+                        StoredReasoning(message["id"])
+
+
 @solara.component
 def ChatMessage(
     message: Message,
@@ -26,10 +60,43 @@ def ChatMessage(
             avatar_background_color="primary" if message["role"] == "assistant" else None,
             border_radius="20px",
         ):
-            if message["chain_of_reason"] is not None:
-                with solara.Details(summary="Chain of Thought"):
-                    solara.Markdown(message["chain_of_reason"] or "")
+            if message["reasoning_length"] is not None:
+                ChainOfThought(message)
             solara.Markdown(message["content"] or "")
+            if message["truncated"]:
+                solara.Text("Stopped before the answer was finished", style={"opacity": "0.6"})
+
+
+@solara.component
+def SearchResult(result: Any, on_select: Callable[[Any], None]):
+    def _on_click(*_):
+        on_select(result)
+
+    with solara.v.ListItem(dense=True, style_="cursor: pointer;") as item:
+        solara.v.ListItemTitle(children=[result["title"]])
+        solara.v.ListItemSubtitle(children=[result["snippet"]])
+
+    use_event(item, "click", _on_click)
+
+
+@solara.component
+def SearchResults(
+    results: list[Any],
+    on_select: Callable[[Any], None],
+    on_load_more: Callable[[], None] | None = None,
+):
+    if len(results) == 0:
+        solara.Text("No messages found", style={"padding": "8px 16px", "opacity": "0.6"})
+    with solara.v.List(dense=True):
+        for result in results:
+            SearchResult(result, on_select).key(str(result["message_id"]))
+    if on_load_more is not None:
+        solara.Button(
+            label="More results",
+            on_click=on_load_more,
+            text=True,
+            style={"width": "100%"},
+        )
 
 
 @solara.component
@@ -67,7 +134,9 @@ def H3(children=[], on_click=None, style: dict[str, str] | str = {}):
 
 
 @solara.component
-def ChatTitle(selected_chat: solara.Reactive[ChatDict]):
+def ChatTitle(
+    selected_chat: solara.Reactive[ChatDict], on_save: Callable[[ChatDict], None] | None = None
+):
     editing = solara.use_reactive(False)
     # Keep a local copy of the selected chat that we can modify
     # And then use to update the database
@@ -88,6 +157,8 @@ def ChatTitle(selected_chat: solara.Reactive[ChatDict]):
             "model": selected_chat.value["model"],
         }
         selected_chat.value = new_details
+        if on_save is not None:
+            on_save(new_details)
 
     save_title = solara.lab.use_task(_save_title, dependencies=None)
 
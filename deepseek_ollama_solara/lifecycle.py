@@ -0,0 +1,86 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import uuid
+
+from ollama import ProcessResponse
+
+from .client import Backend, choose_backend, on_every_backend, pin_chat
+
+# How long Ollama keeps a model in memory after its last request, as seconds or a
+# duration string like "30m". -1 keeps it loaded, None uses the server default.
+DEFAULT_KEEP_ALIVE: float | str | None = None
+KEEP_ALIVE: dict[str, float | str] = {}
+
+# Seconds before the list of models loaded in Ollama is fetched again
+RESIDENT_MODELS_REFRESH_INTERVAL = 10
+
+# Loads in progress per server and model, shared by all sessions so a model is only
+# loaded once. These are thread-safe futures because sessions may run on different
+# event loops.
+_warm_ups: dict[tuple[str | None, str], concurrent.futures.Future[None]] = {}
+_warm_up_tasks: set[asyncio.Task] = set()
+_lock = threading.Lock()
+
+_resident_models: list[ProcessResponse.Model] = []
+_resident_models_fetched_at: float | None = None
+
+
+def keep_alive(model: str) -> float | str | None:
+    return KEEP_ALIVE.get(model, DEFAULT_KEEP_ALIVE)
+
+
+async def list_resident_models(refresh: bool = False) -> list[ProcessResponse.Model]:
+    """Models loaded on any of the servers."""
+    global _resident_models, _resident_models_fetched_at
+    if (
+        refresh
+        or _resident_models_fetched_at is None
+        or time.monotonic() - _resident_models_fetched_at > RESIDENT_MODELS_REFRESH_INTERVAL
+    ):
+        resident_models: dict[str, ProcessResponse.Model] = {}
+        for backend, running in await on_every_backend(lambda client: client.ps()):
+            backend.resident_models = {str(model.model) for model in running.models}
+            for model in running.models:
+                resident_models.setdefault(str(model.model), model)
+        _resident_models = list(resident_models.values())
+        _resident_models_fetched_at = time.monotonic()
+    return _resident_models
+
+
+async def warm_up(model: str, chat_id: uuid.UUID | None = None):
+    """Loads `model` into memory, joining the load another session already started.
+
+    The model is loaded on the server the chat's next message will be sent to.
+    """
+    await list_resident_models()
+    backend = choose_backend(model, chat_id)
+    pin_chat(chat_id, backend)
+    if model in backend.resident_models:
+        return
+    key = (backend.host, model)
+    with _lock:
+        future = _warm_ups.get(key)
+        if future is None:
+            future = _warm_ups[key] = concurrent.futures.Future()
+            # the load carries on when the session that started it goes away
+            task = asyncio.create_task(_load(backend, model, future))
+            _warm_up_tasks.add(task)
+            task.add_done_callback(_warm_up_tasks.discard)
+    await asyncio.shield(asyncio.wrap_future(future))
+
+
+async def _load(backend: Backend, model: str, future: concurrent.futures.Future[None]):
+    try:
+        # a request without a prompt only loads the model
+        with backend.request():
+            await backend.client().generate(model=model, keep_alive=keep_alive(model))
+        await list_resident_models(refresh=True)
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(None)
+    finally:
+        with _lock:
+            del _warm_ups[(backend.host, model)]
@@ -0,0 +1,313 @@
+import asyncio
+import datetime
+import json
+import os
+import threading
+import uuid
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+from ollama._types import ResponseError
+from typing_extensions import TypedDict
+
+from .client import CONNECTION_ERRORS, choose_backend
+from .context import estimate_tokens
+from .database import (
+    clear_memory,
+    get_last_indexed_message,
+    get_memory_messages,
+    get_memory_size,
+    get_unindexed_messages,
+    save_memory_rows,
+)
+
+# Ollama model used to embed messages, memory is only used when a server has it
+EMBEDDING_MODEL = "nomic-embed-text"
+# Embeddings are shortened to this many dimensions. Models trained for it, like
+# nomic-embed-text, lose little by it, and it keeps searching a million messages fast.
+EMBEDDING_DIMENSIONS = 256
+# nomic-embed-text expects the kind of text to be given as a prefix
+EMBEDDING_DOCUMENT_PREFIX = "search_document: "
+EMBEDDING_QUERY_PREFIX = "search_query: "
+
+# Vectors are stored in this file, which is memory-mapped, next to the database
+MEMORY_PATH = "./chats.memory"
+
+# Roles of the messages that are remembered, and how much of each is embedded
+MEMORY_ROLES = ("user", "assistant")
+MEMORY_TEXT_CHARS = 2000
+# Messages embedded per request while indexing
+INDEX_BATCH_SIZE = 64
+
+# At most this many recalled messages, taking up at most this many tokens, are added
+# to a turn. Messages less similar to the question than MEMORY_MIN_SCORE are left out.
+MEMORY_TOP_K = 4
+MEMORY_BUDGET_TOKENS = 400
+MEMORY_MIN_SCORE = 0.5
+MEMORY_SNIPPET_CHARS = 600
+# Candidates fetched per wanted result, to make up for the ones that are filtered out
+MEMORY_OVERSAMPLING = 8
+
+# Rows scored at a time, so a search never holds more than this many scores in memory
+SEARCH_CHUNK_ROWS = 65536
+
+Embedder = Callable[[list[str]], Awaitable[np.ndarray]]
+
+
+class Recollection(TypedDict):
+    chat_id: uuid.UUID
+    title: str
+    role: str
+    created: datetime.datetime
+    content: str
+    score: float
+
+
+async def ollama_embedder(texts: list[str]) -> np.ndarray:
+    client = choose_backend(EMBEDDING_MODEL).client()
+    response = await client.embed(
+        model=EMBEDDING_MODEL, input=texts, dimensions=EMBEDDING_DIMENSIONS
+    )
+    return np.array(response.embeddings, dtype=np.float32)
+
+
+def normalize(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    # servers that ignore the requested dimensions return the full vectors
+    vectors = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorStore:
+    """Unit length vectors in a memory-mapped file, one per row."""
+
+    def __init__(self, path: str, dimensions: int):
+        self.path = path
+        self.dimensions = dimensions
+        self._vectors: np.memmap | None = None
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _map(self, capacity: int):
+        # the file grows in steps, so appending doesn't remap it every time
+        row_bytes = self.dimensions * np.dtype(np.float32).itemsize
+        with open(self.path, "ab") as file:
+            if file.tell() < capacity * row_bytes:
+                file.truncate(capacity * row_bytes)
+        capacity = os.path.getsize(self.path) // row_bytes
+        if capacity > 0:
+            self._vectors = np.memmap(
+                self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions)
+            )
+
+    def open(self):
+        self._map(0)
+
+    def write(self, row: int, vectors: np.ndarray):
+        if row + len(vectors) > self.capacity:
+            self._map(max(row + len(vectors), self.capacity * 2, 4096))
+        assert self._vectors is not None
+        self._vectors[row : row + len(vectors)] = vectors
+        self._vectors.flush()
+
+    def search(self, query: np.ndarray, rows: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+        """The `count` rows among the first `rows` most similar to `query`, best first."""
+        vectors = self._vectors
+        if vectors is None or rows == 0 or count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        best_rows: list[np.ndarray] = []
+        best_scores: list[np.ndarray] = []
+        for start in range(0, rows, SEARCH_CHUNK_ROWS):
+            scores = vectors[start : min(start + SEARCH_CHUNK_ROWS, rows)] @ query
+            if count < len(scores):
+                top = np.argpartition(-scores, count - 1)[:count]
+            else:
+                top = np.arange(len(scores))
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        candidate_rows = np.concatenate(best_rows)
+        candidate_scores = np.concatenate(best_scores)
+        order = np.argsort(-candidate_scores, kind="stable")[:count]
+        return candidate_rows[order], candidate_scores[order]
+
+
+class MemoryIndex:
+    """Embeddings of stored messages, for recalling them in other conversations.
+
+    The vectors are kept in a memory-mapped file, and which message each row belongs
+    to in the database. Messages are added by `sync`, which picks up every finished
+    message that isn't indexed yet, so it can run after every turn.
+    """
+
+    def __init__(
+        self,
+        path: str = MEMORY_PATH,
+        embed: Embedder = ollama_embedder,
+        model: str = EMBEDDING_MODEL,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+    ):
+        self.path = path
+        self.embed = embed
+        self.model = model
+        self.dimensions = dimensions
+        self.store = VectorStore(path, dimensions)
+        self.rows = 0
+        # rowid of the last indexed message, messages are indexed in the order they are stored
+        self.indexed_until = 0
+        # set when the embedding model is available
+        self.enabled = False
+        self._opened = False
+        self._lock = threading.Lock()
+        self._syncing = False
+        self._sync_again = False
+        self._sync_tasks: set[asyncio.Task] = set()
+
+    async def open(self):
+        if self._opened:
+            return
+        info_path = f"{self.path}.json"
+        info = {"model": self.model, "dimensions": self.dimensions}
+        existing_info = None
+        if os.path.exists(info_path):
+            with open(info_path) as file:
+                existing_info = json.load(file)
+        if existing_info != info:
+            # vectors from another model can't be compared, start over
+            await clear_memory()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            with open(info_path, "w") as file:
+                json.dump(info, file)
+        self.store.open()
+        self.rows = await get_memory_size()
+        self.indexed_until = await get_last_indexed_message()
+        self._opened = True
+
+    async def sync(self):
+        """Indexes the finished messages that aren't indexed yet."""
+        with self._lock:
+            if self._syncing:
+                # the running sync goes around once more to pick up the new messages
+                self._sync_again = True
+                return
+            self._syncing = True
+        try:
+            await self.open()
+            while True:
+                with self._lock:
+                    self._sync_again = False
+                while await self._index_batch():
+                    pass
+                with self._lock:
+                    if not self._sync_again:
+                        break
+        finally:
+            with self._lock:
+                self._syncing = False
+
+    def schedule_sync(self):
+        # runs in the background, and keeps going when the session that started it ends
+        task = asyncio.create_task(self._sync_in_background())
+        self._sync_tasks.add(task)
+        task.add_done_callback(self._sync_tasks.discard)
+
+    async def _sync_in_background(self):
+        try:
+            await self.sync()
+        except (ResponseError, *CONNECTION_ERRORS):
+            # whatever is left is picked up by the next sync
+            pass
+
+    async def _index_batch(self) -> bool:
+        unindexed = await get_unindexed_messages(MEMORY_ROLES, self.indexed_until, INDEX_BATCH_SIZE)
+        if not unindexed:
+            return False
+        texts = [
+            EMBEDDING_DOCUMENT_PREFIX + (message["content"] or "")[:MEMORY_TEXT_CHARS]
+            for message in unindexed
+        ]
+        vectors = normalize(await self.embed(texts), self.dimensions)
+        row = self.rows
+        await asyncio.to_thread(self.store.write, row, vectors)
+        await save_memory_rows([(row + i, message["id"]) for i, message in enumerate(unindexed)])
+        self.rows = row + len(unindexed)
+        self.indexed_until = unindexed[-1]["rowid"]
+        return len(unindexed) == INDEX_BATCH_SIZE
+
+    async def recall(
+        self,
+        query: str,
+        chat_id: uuid.UUID | None = None,
+        before: datetime.datetime | None = None,
+        top_k: int = MEMORY_TOP_K,
+        budget_tokens: int = MEMORY_BUDGET_TOKENS,
+    ) -> list[Recollection]:
+        """Stored messages most similar to `query`, within the token budget.
+
+        Messages of the chat `chat_id` are only recalled if they were created before
+        `before`, since the newer ones are in the prompt already.
+        """
+        await self.open()
+        if self.rows == 0:
+            return []
+        query_vector = normalize(
+            await self.embed([EMBEDDING_QUERY_PREFIX + query[:MEMORY_TEXT_CHARS]]),
+            self.dimensions,
+        )[0]
+        # searching a large index takes a while, keep it off the event loop
+        rows, scores = await asyncio.to_thread(
+            self.store.search, query_vector, self.rows, top_k * MEMORY_OVERSAMPLING
+        )
+        keep = scores >= MEMORY_MIN_SCORE
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) == 0:
+            return []
+        stored = {message["row"]: message for message in await get_memory_messages(rows.tolist())}
+
+        recollections: list[Recollection] = []
+        used_tokens = 0
+        for row, score in zip(rows.tolist(), scores.tolist()):
+            message = stored.get(row)
+            if message is None:
+                continue
+            if message["chat_id"] == chat_id and (before is None or message["created"] >= before):
+                continue
+            content = message["content"] or ""
+            if len(content) > MEMORY_SNIPPET_CHARS:
+                content = content[:MEMORY_SNIPPET_CHARS] + "…"
+            tokens = estimate_tokens(content)
+            if used_tokens + tokens > budget_tokens:
+                continue
+            used_tokens += tokens
+            recollections.append(
+                Recollection(
+                    chat_id=message["chat_id"],
+                    title=message["title"],
+                    role=message["role"],
+                    created=message["created"],
+                    content=content,
+                    score=score,
+                )
+            )
+            if len(recollections) == top_k:
+                break
+        return recollections
+
+
+def format_recollections(recollections: list[Recollection]) -> str:
+    parts = ["Excerpts from earlier conversations, use them if they are relevant:"]
+    for recollection in recollections:
+        parts.append(
+            f'[{recollection["created"]:%Y-%m-%d}, "{recollection["title"]}", '
+            f"{recollection['role']}] {recollection['content']}"
+        )
+    return "\n\n".join(parts)
+
+
+def embedding_model_available(models: list[str]) -> bool:
+    return EMBEDDING_MODEL in models or f"{EMBEDDING_MODEL}:latest" in models
+
+
+memory_index = MemoryIndex()
@@ -0,0 +1,143 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import uuid
+
+from .database import database, save_messages
+from .types import Message
+
+# A message that is still streaming is saved at most this often, so a crash loses
+# no more than this many seconds of it
+CHECKPOINT_INTERVAL = 2.0
+
+# Most writes committed in a single transaction
+WRITE_BATCH_SIZE = 256
+
+
+class _Write:
+    def __init__(
+        self,
+        chat_messages: list[tuple[uuid.UUID, Message]],
+        final: bool,
+        done: concurrent.futures.Future[None] | None = None,
+    ):
+        self.chat_messages = chat_messages
+        self.final = final
+        self.done = done
+
+
+class MessageWriter:
+    """Saves messages in the background, batching writes from all sessions.
+
+    Writes are queued and committed together by a single task holding one
+    connection, so sessions don't contend for the database lock.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[_Write | None] | None = None
+        self._task: asyncio.Task | None = None
+
+    def _put(self, write: _Write):
+        with self._lock:
+            if (
+                self._task is None
+                or self._task.done()
+                or self._loop is None
+                or self._loop.is_closed()
+            ):
+                # the writer runs on the loop of whoever writes first
+                self._loop = asyncio.get_running_loop()
+                self._queue = asyncio.Queue()
+                self._task = self._loop.create_task(self._run(self._queue))
+            loop, queue = self._loop, self._queue
+        assert queue is not None
+        if loop is asyncio.get_running_loop():
+            queue.put_nowait(write)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, write)
+
+    def checkpoint(self, chat_id: uuid.UUID, message: Message):
+        """Queues an unfinished message to be saved, without waiting for it."""
+        self._put(_Write([(chat_id, message)], final=False))
+
+    async def save(self, chat_id: uuid.UUID, chat_messages: list[Message]):
+        """Saves finished messages, returns once they are committed."""
+        done: concurrent.futures.Future[None] = concurrent.futures.Future()
+        self._put(_Write([(chat_id, message) for message in chat_messages], True, done))
+        await asyncio.wrap_future(done)
+
+    async def close(self):
+        """Writes what is queued and stops the writer."""
+        with self._lock:
+            loop, queue, task = self._loop, self._queue, self._task
+            self._task = None
+        if task is None or queue is None or loop is None or task.done():
+            return
+        if loop is asyncio.get_running_loop():
+            queue.put_nowait(None)
+            await task
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def _run(self, queue: asyncio.Queue[_Write | None]):
+        async with database.connection():
+            while True:
+                write = await queue.get()
+                batch: list[_Write] = []
+                while write is not None:
+                    batch.append(write)
+                    if len(batch) == self.batch_size or queue.empty():
+                        break
+                    write = queue.get_nowait()
+                if batch:
+                    await self._commit(batch)
+                if write is None:
+                    return
+
+    async def _commit(self, batch: list[_Write]):
+        # a message checkpointed several times in the batch only needs its last version,
+        # and a final save replaces any checkpoint of the same message
+        checkpoints: dict[uuid.UUID, tuple[uuid.UUID, Message]] = {}
+        finished: dict[uuid.UUID, tuple[uuid.UUID, Message]] = {}
+        for write in batch:
+            for chat_id, message in write.chat_messages:
+                if write.final:
+                    checkpoints.pop(message.id, None)
+                    finished[message.id] = (chat_id, message)
+                elif message.id not in finished:
+                    checkpoints[message.id] = (chat_id, message)
+        try:
+            async with database.transaction():
+                await save_messages(list(checkpoints.values()), search_index=False)
+                await save_messages(list(finished.values()))
+        except Exception as e:
+            for write in batch:
+                if write.done is not None:
+                    write.done.set_exception(e)
+        else:
+            for write in batch:
+                if write.done is not None:
+                    write.done.set_result(None)
+
+
+class TurnCheckpointer:
+    """Checkpoints the assistant message of one turn while it streams."""
+
+    def __init__(self, writer: "MessageWriter", chat_id: uuid.UUID):
+        self.writer = writer
+        self.chat_id = chat_id
+        self._last_checkpoint: dict[uuid.UUID, float] = {}
+
+    def message_updated(self, message: Message):
+        now = time.monotonic()
+        if now - self._last_checkpoint.get(message.id, 0.0) >= CHECKPOINT_INTERVAL:
+            self._last_checkpoint[message.id] = now
+            # until the final save, the message counts as cut off
+            self.writer.checkpoint(self.chat_id, message.model_copy(update={"truncated": True}))
+
+
+message_writer = MessageWriter()
@@ -0,0 +1,65 @@
+# Tags models put around their chain of thought when they write it into the content.
+# Models are looked up by name, then by name without the tag, and use DEFAULT_DELIMITERS
+# when neither is listed.
+DEFAULT_DELIMITERS = ("<think>", "</think>")
+REASONING_DELIMITERS: dict[str, tuple[str, str]] = {
+    "marco-o1": ("<Thought>", "</Thought>"),
+}
+
+Segment = tuple[str, bool]
+
+
+def reasoning_delimiters(model: str | None) -> tuple[str, str]:
+    if model is None:
+        return DEFAULT_DELIMITERS
+    return REASONING_DELIMITERS.get(
+        model, REASONING_DELIMITERS.get(model.split(":")[0], DEFAULT_DELIMITERS)
+    )
+
+
+def _partial_tag_length(text: str, start: int, tag: str) -> int:
+    # length of the longest end of text[start:] that is the start of `tag`
+    if text.find(tag[0], max(start, len(text) - len(tag) + 1)) == -1:
+        return 0
+    for length in range(min(len(tag) - 1, len(text) - start), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ReasoningParser:
+    """Splits streamed text into (text, is_reasoning) segments as it arrives.
+
+    Tags can be split over several deltas, or arrive along with other text. The end of
+    a delta that may be the start of a tag is held back until the next one shows
+    whether it is. Deltas without tags are passed on as they are, without copying.
+    """
+
+    def __init__(self, delimiters: tuple[str, str] = DEFAULT_DELIMITERS):
+        self.open_tag, self.close_tag = delimiters
+        self.thinking = False
+        self._held = ""
+
+    def feed(self, delta: str) -> list[Segment]:
+        text = self._held + delta if self._held else delta
+        segments: list[Segment] = []
+        position = 0
+        tag = self.close_tag if self.thinking else self.open_tag
+        while (index := text.find(tag, position)) != -1:
+            if index > position:
+                segments.append((text[position:index], self.thinking))
+            position = index + len(tag)
+            self.thinking = not self.thinking
+            tag = self.close_tag if self.thinking else self.open_tag
+        end = len(text) - _partial_tag_length(text, position, tag)
+        if end > position:
+            whole = position == 0 and end == len(text)
+            segments.append((text if whole else text[position:end], self.thinking))
+        self._held = text[end:]
+        return segments
+
+    def finish(self) -> list[Segment]:
+        """Whatever is still held back, once the stream has ended."""
+        # a tag that never completed was text after all
+        held, self._held = self._held, ""
+        return [(held, self.thinking)] if held else []
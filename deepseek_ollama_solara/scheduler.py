@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import itertools
+import threading
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import Callable
+
+from .client import model_concurrency, serving_backends
+
+# Requests waiting for a model beyond this are turned away instead of queued
+MAX_QUEUED_GENERATIONS = 32
+
+
+class QueueFull(Exception):
+    pass
+
+
+_sequence = itertools.count()
+
+
+class _Waiter:
+    def __init__(self, user: str):
+        self.user = user
+        self.sequence = next(_sequence)
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.granted = False
+        self.position = 0
+
+    def notify(self):
+        # waiters may live on another event loop than the session releasing a slot
+        self.loop.call_soon_threadsafe(self.changed.set)
+
+
+class _ModelQueue:
+    def __init__(self):
+        self.running = 0
+        self.waiting: dict[str, deque[_Waiter]] = {}
+        # generations granted per user since the model was last idle
+        self.served: dict[str, int] = {}
+
+    def __len__(self):
+        return sum(len(waiters) for waiters in self.waiting.values())
+
+    def order(self) -> list[_Waiter]:
+        # Users take turns: a waiter ranks by how many generations its user already
+        # got plus how many of its own requests are ahead of it, ties go to whoever
+        # asked first. A user with many requests can't starve the others.
+        ranked = [
+            (self.served.get(user, 0) + depth, waiter.sequence, waiter)
+            for user, waiters in self.waiting.items()
+            for depth, waiter in enumerate(waiters)
+        ]
+        ranked.sort(key=lambda item: item[:2])
+        return [waiter for *_, waiter in ranked]
+
+    def grant(self, waiter: _Waiter):
+        waiter.granted = True
+        self.running += 1
+        self.served[waiter.user] = self.served.get(waiter.user, 0) + 1
+
+    def pop_next(self) -> _Waiter:
+        waiter = self.order()[0]
+        self.remove(waiter)
+        return waiter
+
+    def remove(self, waiter: _Waiter):
+        waiters = self.waiting.get(waiter.user)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.waiting[waiter.user]
+
+
+class GenerationScheduler:
+    """Limits concurrent generations per model and hands out slots fairly across users."""
+
+    def __init__(self, max_queued: int = MAX_QUEUED_GENERATIONS):
+        self.max_queued = max_queued
+        self._queues: dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+
+    def concurrency(self, model: str) -> int:
+        # client.MODEL_CONCURRENCY on every server that has the model, choose_backend
+        # then sends each generation to a server with room for it
+        return model_concurrency(model) * serving_backends(model)
+
+    def queued(self, model: str) -> int:
+        with self._lock:
+            queue = self._queues.get(model)
+            return len(queue) if queue is not None else 0
+
+    def running(self, model: str) -> int:
+        with self._lock:
+            queue = self._queues.get(model)
+            return queue.running if queue is not None else 0
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        user: str,
+        on_position: Callable[[int | None], None] | None = None,
+    ) -> AsyncIterator[None]:
+        """Waits for a free generation slot for `model`.
+
+        `on_position` is called from the waiting task with the 1-based queue
+        position whenever it changes, and with None once the slot is granted.
+        Raises QueueFull when too many requests are already waiting.
+        """
+        waiter = _Waiter(user)
+        with self._lock:
+            queue = self._queues.setdefault(model, _ModelQueue())
+            if queue.running < self.concurrency(model) and len(queue) == 0:
+                queue.grant(waiter)
+            elif len(queue) >= self.max_queued:
+                raise QueueFull(f"Too many requests are waiting for {model}, try again later")
+            else:
+                queue.waiting.setdefault(user, deque()).append(waiter)
+                self._update_positions(queue)
+
+        try:
+            while not waiter.granted:
+                if on_position is not None:
+                    on_position(waiter.position)
+                waiter.changed.clear()
+                await waiter.changed.wait()
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    # granted while being cancelled, pass the slot on
+                    self._release(model, queue)
+                else:
+                    queue.remove(waiter)
+                    self._update_positions(queue)
+            raise
+
+        if on_position is not None:
+            on_position(None)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release(model, queue)
+
+    def _release(self, model: str, queue: _ModelQueue):
+        queue.running -= 1
+        while queue.running < self.concurrency(model) and len(queue) > 0:
+            waiter = queue.pop_next()
+            queue.grant(waiter)
+            waiter.notify()
+        if queue.running == 0:
+            queue.served.clear()
+        self._update_positions(queue)
+
+    def _update_positions(self, queue: _ModelQueue):
+        for position, waiter in enumerate(queue.order(), start=1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.notify()
+
+
+scheduler = GenerationScheduler()
@@ -0,0 +1,107 @@
+import datetime
+import io
+import time
+import uuid
+
+from .reasoning import DEFAULT_DELIMITERS, ReasoningParser
+from .types import Message
+
+# How often the streamed assistant message is pushed to the reactive state.
+# A flush happens when either limit is reached, and always when the stream is done.
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+STREAM_FLUSH_TOKENS = 64
+
+
+class StreamAccumulator:
+    """Collects streamed deltas and builds the assistant message at a limited rate."""
+
+    def __init__(
+        self,
+        delimiters: tuple[str, str] = DEFAULT_DELIMITERS,
+        flush_interval: float = STREAM_FLUSH_INTERVAL,
+        flush_tokens: int = STREAM_FLUSH_TOKENS,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_tokens = flush_tokens
+        self.message: Message | None = None
+        self.parser = ReasoningParser(delimiters)
+        # every flush builds a new message, but they are all the same message
+        self._id = uuid.uuid4()
+        self._created: datetime.datetime | None = None
+        # Deltas are written to growing buffers, so a flush copies the text once. Adding
+        # them to the last flushed string would copy it again, as the message holds it.
+        self._content: io.StringIO | None = None
+        self._chain_of_reason: io.StringIO | None = None
+        self._content_changed = False
+        self._chain_of_reason_changed = False
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+
+    def _write(self, text: str, thinking: bool):
+        if thinking:
+            if self._chain_of_reason is None:
+                self._chain_of_reason = io.StringIO()
+            self._chain_of_reason.write(text)
+            self._chain_of_reason_changed = True
+        else:
+            if self._content is None:
+                self._content = io.StringIO()
+            self._content.write(text)
+            self._content_changed = True
+
+    def _buffered(self) -> bool:
+        if self._created is None:
+            self._created = datetime.datetime.now()
+        self._pending_count += 1
+        return (
+            self._pending_count >= self.flush_tokens
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def append(self, delta: str, thinking: bool = False) -> bool:
+        """Buffer a delta, returns whether the caller should flush now."""
+        self._write(delta, thinking)
+        return self._buffered()
+
+    def append_content(self, delta: str) -> bool:
+        """Like `append`, for content the chain of thought still has to be split out of."""
+        segments = self.parser.feed(delta)
+        if not segments:
+            # a tag, or the start of one
+            return False
+        for text, thinking in segments:
+            self._write(text, thinking)
+        return self._buffered()
+
+    def finish(self):
+        """Buffer what the parser held back, at the end of the stream."""
+        for text, thinking in self.parser.finish():
+            self._write(text, thinking)
+            self._buffered()
+
+    @property
+    def pending(self) -> bool:
+        return self._pending_count > 0
+
+    def flush(self) -> Message | None:
+        """Fold the buffered deltas into a new message, or return None if nothing changed."""
+        if not self.pending:
+            return None
+        assert self._created is not None
+        content = self.message.content if self.message is not None else None
+        if self._content is not None and self._content_changed:
+            content = self._content.getvalue()
+        chain_of_reason = self.message.chain_of_reason if self.message is not None else None
+        if self._chain_of_reason is not None and self._chain_of_reason_changed:
+            chain_of_reason = self._chain_of_reason.getvalue()
+        self._content_changed = self._chain_of_reason_changed = False
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self.message = Message(
+            id=self._id,
+            role="assistant",
+            created=self._created,
+            content=content,
+            chain_of_reason=chain_of_reason,
+        )
+        return self.message
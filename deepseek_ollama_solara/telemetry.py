@@ -0,0 +1,67 @@
+import datetime
+import time
+
+from ollama import ChatResponse
+
+from .types import TurnMetrics
+
+NANOSECONDS = 1_000_000_000
+
+
+class TurnMetricsRecorder:
+    """Collects the timings of one assistant turn, across all of its tool rounds."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.created = datetime.datetime.now()
+        self.tool_latencies: dict[str, list[float]] = {}
+        self.persist_duration: float | None = None
+        self._request_started: float | None = None
+        self._first_token: float | None = None
+        self._prompt_tokens: int | None = None
+        self._eval_tokens: int | None = None
+        self._eval_duration = 0
+        self._load_duration: int | None = None
+
+    def request_started(self):
+        if self._request_started is None:
+            self._request_started = time.perf_counter()
+
+    def token_received(self):
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+
+    def response_done(self, chunk: ChatResponse):
+        # Ollama reports these on the final chunk of every response, in nanoseconds
+        if chunk.prompt_eval_count is not None:
+            self._prompt_tokens = (self._prompt_tokens or 0) + chunk.prompt_eval_count
+        if chunk.eval_count is not None and chunk.eval_duration:
+            self._eval_tokens = (self._eval_tokens or 0) + chunk.eval_count
+            self._eval_duration += chunk.eval_duration
+        if chunk.load_duration is not None:
+            self._load_duration = (self._load_duration or 0) + chunk.load_duration
+
+    def tool_finished(self, name: str, seconds: float):
+        self.tool_latencies.setdefault(name, []).append(seconds)
+
+    def metrics(self) -> TurnMetrics:
+        time_to_first_token = None
+        if self._request_started is not None and self._first_token is not None:
+            time_to_first_token = self._first_token - self._request_started
+        return TurnMetrics(
+            model=self.model,
+            created=self.created,
+            time_to_first_token=time_to_first_token,
+            tokens_per_second=(
+                self._eval_tokens / self._eval_duration * NANOSECONDS
+                if self._eval_tokens is not None
+                else None
+            ),
+            prompt_tokens=self._prompt_tokens,
+            eval_tokens=self._eval_tokens,
+            load_duration=(
+                self._load_duration / NANOSECONDS if self._load_duration is not None else None
+            ),
+            tool_latencies=self.tool_latencies,
+            persist_duration=self.persist_duration,
+        )
@@ -1,9 +1,18 @@
+import asyncio
+import importlib
+import time
+from collections.abc import Mapping, Sequence
 from typing import Any, Callable, Coroutine
 
+from ollama import Message
+
 from ..types import ToolResult
-from .web import lookup_wikipedia, search_duckduckgo
+from .breaker import CircuitBreaker
+from .cache import TOOL_CACHE_PERSISTENT, ToolCache, is_error_result, normalize_arguments
+
+ToolFunction = Callable[[Any], Coroutine[Any, Any, ToolResult]]
 
-tools = [
+tools: list[dict[str, Any]] = [
     {
         "type": "function",
         "function": {
@@ -37,6 +46,10 @@ tools = [
                         "type": "string",
                         "description": "The name of the article to look up.",
                     },
+                    "query": {
+                        "type": "string",
+                        "description": "What to find out from the article, only the most relevant passages are returned.",
+                    },
                 },
                 "required": ["name"],
             },
@@ -45,14 +58,135 @@ tools = [
 ]
 
 # Note: Tools should be async
-tool_callables: dict[str, Callable[[Any], Coroutine[Any, Any, ToolResult]]] = {
-    "search_duckduckgo": search_duckduckgo,
-    "lookup_wikipedia": lookup_wikipedia,
+# Tools given as "module:function" are imported on their first call, so the web
+# clients and their dependencies don't slow down startup when tools aren't used
+tool_callables: dict[str, ToolFunction | str] = {
+    "search_duckduckgo": f"{__name__}.web:search_duckduckgo",
+    "lookup_wikipedia": f"{__name__}.web:lookup_wikipedia",
 }
 
+# Seconds a single tool call may take before it is abandoned
+DEFAULT_TOOL_TIMEOUT = 20.0
+tool_timeouts: dict[str, float] = {}
+
+tool_cache = ToolCache(persistent=TOOL_CACHE_PERSISTENT)
+
+# Maximum number of tool calls from a single response that run at the same time
+MAX_CONCURRENT_TOOL_CALLS = 4
+
+breakers: dict[str, CircuitBreaker] = {}
+
 
 def add_tool(
-    function: Callable[[Any], Coroutine[Any, Any, ToolResult]], description: dict[str, Any]
+    function: ToolFunction | str,
+    description: dict[str, Any],
+    timeout: float | None = None,
 ):
+    """Registers a tool, `function` can be a "module:function" path to import it lazily."""
     tools.append(description)
-    tool_callables[description["function"]["name"]] = function
+    name = description["function"]["name"]
+    tool_callables[name] = function
+    if timeout is not None:
+        tool_timeouts[name] = timeout
+
+
+def tool_breaker(name: str) -> CircuitBreaker:
+    return breakers.setdefault(name, CircuitBreaker())
+
+
+def available_tools() -> list[dict[str, Any]]:
+    """The tools to offer the model, leaving out the ones that keep failing."""
+    return [tool for tool in tools if tool_breaker(tool["function"]["name"]).available]
+
+
+async def _load_tool(name: str) -> ToolFunction:
+    function = tool_callables[name]
+    if isinstance(function, str):
+        module_name, _, attribute = function.partition(":")
+        # imports can take a while, keep them off the event loop
+        module = await asyncio.to_thread(importlib.import_module, module_name)
+        function = getattr(module, attribute)
+        tool_callables[name] = function
+    return function
+
+
+async def run_tool_call(
+    name: str, arguments: Mapping[str, Any], deadline: float | None = None
+) -> ToolResult:
+    """Calls a tool, giving up at `deadline` (a time.monotonic() value) if one is given."""
+    if name not in tool_callables:
+        return ToolResult(
+            message=f"Attempted to call unknown tool '{name}'", content=f"Error: no tool '{name}'"
+        )
+    breaker = tool_breaker(name)
+    try:
+        function = await _load_tool(name)
+    except (ImportError, AttributeError) as e:
+        breaker.record(False)
+        return ToolResult(
+            message=f"Attempted to call '{name}', but it couldn't be loaded", content=f"Error: {e}"
+        )
+    normalized_arguments = normalize_arguments(function, arguments)
+    cached_result = await tool_cache.get(name, normalized_arguments)
+    if cached_result is not None:
+        return cached_result
+
+    timeout = tool_timeouts.get(name, DEFAULT_TOOL_TIMEOUT)
+    turn_timeout = deadline - time.monotonic() if deadline is not None else timeout
+    stopped = ToolResult(
+        message=f"Stopped calling '{name}', the answer took too long",
+        content=f"Error: '{name}' was stopped, there is no time left for tools",
+    )
+    if turn_timeout <= 0:
+        return stopped
+    if not breaker.allow():
+        # the model may still call a tool it saw earlier in the chat
+        return ToolResult(
+            message=f"Skipped calling '{name}', it failed too often recently",
+            content=f"Error: '{name}' is unavailable for {breaker.retry_in():.0f} more seconds",
+        )
+    try:
+        call = function(**arguments)  # type: ignore
+        result = await asyncio.wait_for(call, min(timeout, turn_timeout))
+    except asyncio.TimeoutError:
+        if turn_timeout < timeout:
+            # the turn ran out of time, which isn't the tool's fault
+            breaker.abandon()
+            return stopped
+        breaker.record(False)
+        return ToolResult(
+            message=f"Calling '{name}' timed out after {timeout:g} seconds",
+            content=f"Error: '{name}' timed out",
+        )
+    except asyncio.CancelledError:
+        breaker.abandon()
+        raise
+    except Exception as e:
+        breaker.record(False)
+        return ToolResult(
+            message=f"Attempted to call '{name}', but an error occurred", content=f"Error: {e}"
+        )
+    breaker.record(not is_error_result(result))
+    await tool_cache.set(name, normalized_arguments, result)
+    return result
+
+
+async def run_tool_calls(
+    tool_calls: Sequence[Message.ToolCall],
+    on_tool_finished: Callable[[str, float], None] | None = None,
+    deadline: float | None = None,
+) -> list[ToolResult]:
+    # independent tool calls run concurrently, results keep the order of the calls
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+
+    async def run(tool_call: Message.ToolCall) -> ToolResult:
+        async with semaphore:
+            started = time.perf_counter()
+            result = await run_tool_call(
+                tool_call.function.name, tool_call.function.arguments, deadline
+            )
+            if on_tool_finished is not None:
+                on_tool_finished(tool_call.function.name, time.perf_counter() - started)
+            return result
+
+    return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
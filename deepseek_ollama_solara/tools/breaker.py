@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import deque
+
+# A tool is left out once BREAKER_ERROR_RATE of its last BREAKER_WINDOW calls failed,
+# counting from BREAKER_MIN_CALLS calls so a single failure doesn't do it
+BREAKER_WINDOW = 10
+BREAKER_MIN_CALLS = 3
+BREAKER_ERROR_RATE = 0.5
+# Seconds it is left out for, doubling every time it still fails afterwards
+BREAKER_BACKOFF = 30.0
+BREAKER_MAX_BACKOFF = 600.0
+# Seconds after which a trial call that never reported back is given up on
+BREAKER_PROBE_TIMEOUT = 60.0
+
+
+class CircuitBreaker:
+    """Keeps track of a tool's recent failures, and leaves the tool out while it fails.
+
+    When too many calls fail the breaker opens, and the tool isn't offered to the
+    model until the backoff has passed. It is then half-open: `allow` lets a single
+    trial call through, and the other callers are turned away until it finishes. If
+    it succeeds the breaker closes, if it fails the breaker opens for twice as long.
+    """
+
+    def __init__(self):
+        self.outcomes: deque[bool] = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at: float | None = None
+        self.backoff = BREAKER_BACKOFF
+        # when the trial call of the half-open breaker started
+        self.probe_started_at: float | None = None
+        # shared by all sessions, which may run on different threads
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def retry_in(self) -> float:
+        """Seconds until the tool can be called again, at most, 0 if it can be now."""
+        if self.opened_at is None:
+            return 0.0
+        now = time.monotonic()
+        if self.probe_started_at is not None:
+            return max(0.0, self.probe_started_at + BREAKER_PROBE_TIMEOUT - now)
+        return max(0.0, self.opened_at + self.backoff - now)
+
+    @property
+    def available(self) -> bool:
+        """Whether the tool can be offered, calling it still has to go through `allow`."""
+        return self.retry_in() == 0
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead, the first caller once half-open makes the trial call."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.available:
+                return False
+            self.probe_started_at = time.monotonic()
+            return True
+
+    def abandon(self):
+        """The call ended without showing whether the tool works, like when it was cancelled."""
+        with self._lock:
+            self.probe_started_at = None
+
+    def record(self, success: bool):
+        with self._lock:
+            if self.opened_at is not None:
+                if self.probe_started_at is None:
+                    # a call that started before the breaker opened
+                    return
+                self.probe_started_at = None
+                if success:
+                    self.opened_at = None
+                    self.backoff = BREAKER_BACKOFF
+                    self.outcomes.clear()
+                else:
+                    self.opened_at = time.monotonic()
+                    self.backoff = min(self.backoff * 2, BREAKER_MAX_BACKOFF)
+                return
+            self.outcomes.append(success)
+            if len(self.outcomes) >= BREAKER_MIN_CALLS and self.error_rate >= BREAKER_ERROR_RATE:
+                self.opened_at = time.monotonic()
@@ -0,0 +1,115 @@
+import datetime
+import hashlib
+import inspect
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable
+
+from ..database import delete_tool_results, get_tool_result, save_tool_result
+from ..types import ToolResult
+
+TOOL_CACHE_SIZE = 256
+TOOL_CACHE_TTL = 60 * 60  # seconds
+# Also keep results in the tool_results table of chats.db, so they survive a restart
+TOOL_CACHE_PERSISTENT = True
+
+
+def normalize_arguments(function: Callable[..., Any], arguments: Mapping[str, Any]) -> dict:
+    # fill in default values and collapse whitespace, so equivalent calls share a key
+    try:
+        bound = inspect.signature(function).bind(**arguments)
+        bound.apply_defaults()
+        normalized = dict(bound.arguments)
+    except (TypeError, ValueError):
+        normalized = dict(arguments)
+    return {
+        name: " ".join(value.split()) if isinstance(value, str) else value
+        for name, value in normalized.items()
+    }
+
+
+def is_error_result(result: ToolResult) -> bool:
+    # the tools report failures as a string content starting with "Error"
+    return isinstance(result["content"], str) and result["content"].startswith("Error")
+
+
+class ToolCache:
+    """In-memory LRU of tool results with a TTL, optionally backed by the database."""
+
+    def __init__(
+        self,
+        max_size: int = TOOL_CACHE_SIZE,
+        ttl: float = TOOL_CACHE_TTL,
+        persistent: bool = False,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persistent = persistent
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        # key -> (time stored, serialized result)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # expired rows are deleted from the database at most once per TTL
+        self._pruned_at = 0.0
+
+    @staticmethod
+    def key(name: str, arguments: Mapping[str, Any]) -> str:
+        payload = json.dumps({"name": name, "arguments": arguments}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, name: str, arguments: Mapping[str, Any]) -> ToolResult | None:
+        key = self.key(name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored, result = entry
+            if time.time() - stored < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(result)
+            del self._entries[key]
+
+        if self.persistent:
+            created_after = datetime.datetime.now() - datetime.timedelta(seconds=self.ttl)
+            row = await get_tool_result(key, created_after)
+            if row is not None:
+                serialized, created = row
+                # keeps its age, so it still expires when the stored row does
+                self._store(key, serialized, created.timestamp())
+                self.persistent_hits += 1
+                return json.loads(serialized)
+
+        self.misses += 1
+        return None
+
+    async def set(self, name: str, arguments: Mapping[str, Any], result: ToolResult):
+        if is_error_result(result):
+            return
+        key = self.key(name, arguments)
+        serialized = json.dumps(result)
+        self._store(key, serialized)
+        if self.persistent:
+            now = datetime.datetime.now()
+            await save_tool_result(key, name, serialized, now)
+            if time.time() - self._pruned_at >= self.ttl:
+                self._pruned_at = time.time()
+                await delete_tool_results(now - datetime.timedelta(seconds=self.ttl))
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+    def _store(self, key: str, serialized: str, stored: float | None = None):
+        self._entries[key] = (time.time() if stored is None else stored, serialized)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,136 @@
+import re
+from collections import Counter
+from collections.abc import Sequence
+
+import numpy as np
+from typing_extensions import TypedDict
+
+# Articles are split into passages of about this many characters
+PASSAGE_CHARS = 800
+# At most this many passages, and this many characters of them, go into a tool result
+TOP_PASSAGES = 6
+PASSAGE_BUDGET_CHARS = 4000
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_heading = re.compile(r"^(=+)\s*(.+?)\s*\1$")
+_sentence_end = re.compile(r"(?<=[.!?])\s+")
+_token = re.compile(r"\w+")
+
+
+class Passage(TypedDict):
+    section: str | None
+    text: str
+
+
+def tokenize(text: str) -> list[str]:
+    return _token.findall(text.lower())
+
+
+def _pieces(paragraph: str) -> list[str]:
+    if len(paragraph) <= PASSAGE_CHARS:
+        return [paragraph]
+    # split long paragraphs on sentences, and overlong sentences anywhere
+    pieces = []
+    for sentence in _sentence_end.split(paragraph):
+        pieces += [
+            sentence[start : start + PASSAGE_CHARS]
+            for start in range(0, len(sentence), PASSAGE_CHARS)
+        ]
+    return pieces
+
+
+def split_passages(text: str) -> list[Passage]:
+    """Splits article text into passages, keeping track of the section each is in.
+
+    Section headings are recognized in the "== Title ==" form MediaWiki uses for
+    plain text content.
+    """
+    passages: list[Passage] = []
+    section: str | None = None
+    current: list[str] = []
+
+    def close_passage():
+        if current:
+            passages.append(Passage(section=section, text="\n".join(current)))
+            current.clear()
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        heading = _heading.match(line)
+        if heading is not None:
+            close_passage()
+            section = heading.group(2)
+            continue
+        for piece in _pieces(line):
+            if current and sum(len(part) for part in current) + len(piece) > PASSAGE_CHARS:
+                close_passage()
+            current.append(piece)
+    close_passage()
+    return passages
+
+
+def bm25_scores(documents: Sequence[str], query: str) -> np.ndarray:
+    """BM25 score of every document for the query, only query terms are counted."""
+    terms = sorted(set(tokenize(query)))
+    if not documents or not terms:
+        return np.zeros(len(documents))
+    counts = [Counter(tokenize(document)) for document in documents]
+    term_frequencies = np.array(
+        [[count[term] for term in terms] for count in counts], dtype=np.float64
+    )
+    lengths = np.array([sum(count.values()) for count in counts], dtype=np.float64)
+    document_frequencies = (term_frequencies > 0).sum(axis=0)
+    idf = np.log(1 + (len(documents) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    normalization = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    scores = term_frequencies * (BM25_K1 + 1) / (term_frequencies + normalization[:, None])
+    return scores @ idf
+
+
+def select_passages(
+    passages: Sequence[Passage],
+    query: str,
+    top_k: int = TOP_PASSAGES,
+    budget_chars: int = PASSAGE_BUDGET_CHARS,
+) -> list[Passage]:
+    """Picks the passages that best match the query, within the character budget.
+
+    The start of the article is kept as well, since it usually summarizes the
+    subject. Passages are returned in article order.
+    """
+    if not passages:
+        return []
+    scores = bm25_scores([f"{p['section'] or ''} {p['text']}" for p in passages], query)
+    # stable sort, so passages without any matching term fall back to article order
+    ranked = [0, *(int(i) for i in np.argsort(-scores, kind="stable") if i != 0)]
+    selected: list[int] = []
+    used = 0
+    for index in ranked:
+        if len(selected) == top_k:
+            break
+        length = len(passages[index]["text"])
+        if used + length > budget_chars:
+            if selected:
+                continue
+            length = budget_chars
+        selected.append(index)
+        used += length
+    return [
+        Passage(section=passages[i]["section"], text=passages[i]["text"][:budget_chars])
+        for i in sorted(selected)
+    ]
+
+
+def format_passages(passages: Sequence[Passage]) -> str:
+    parts = []
+    section: str | None = None
+    for passage in passages:
+        if passage["section"] is not None and passage["section"] != section:
+            parts.append(f"## {passage['section']}")
+        section = passage["section"]
+        parts.append(passage["text"])
+    return "\n\n".join(parts)
@@ -1,9 +1,18 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, cast
 
 from duckduckgo_search import DDGS
 from mediawiki import MediaWiki
 
 from ..types import ToolResult
+from .passages import (
+    PASSAGE_BUDGET_CHARS,
+    bm25_scores,
+    format_passages,
+    select_passages,
+    split_passages,
+)
 
 
 class SearchResult(TypedDict):
@@ -12,7 +21,22 @@ class SearchResult(TypedDict):
     content: str | None
 
 
+# DDGS and MediaWiki are synchronous clients, so they run on a shared thread pool
+# to avoid blocking the event loop that serves every connected session
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web-tools")
+
+
 async def search_duckduckgo(query: str, result_count: int = 5):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _search_duckduckgo, query, result_count)
+
+
+async def lookup_wikipedia(name: str, query: str | None = None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _lookup_wikipedia, name, query)
+
+
+def _search_duckduckgo(query: str, result_count: int) -> ToolResult:
     with DDGS() as ddgs:
         try:
             results = ddgs.text(query, max_results=result_count)
@@ -22,14 +46,24 @@ async def search_duckduckgo(query: str, result_count: int = 5):
                 content=f"Error: {e}",
             )
         if results:
-            search_results = [
-                SearchResult(
-                    title=result.get("title", "No Title"),
-                    url=result.get("href"),
-                    content=result.get("body"),
+            # best matches first, with the bodies cut down to the passage budget
+            scores = bm25_scores(
+                [f"{result.get('title', '')} {result.get('body') or ''}" for result in results],
+                query,
+            )
+            budget = PASSAGE_BUDGET_CHARS
+            search_results = []
+            for index in sorted(range(len(results)), key=lambda i: -scores[i]):
+                result = results[index]
+                body = (result.get("body") or "")[:budget]
+                budget -= len(body)
+                search_results.append(
+                    SearchResult(
+                        title=result.get("title", "No Title"),
+                        url=result.get("href"),
+                        content=body or None,
+                    )
                 )
-                for result in results
-            ]
             return ToolResult(message=f"Searched DuckDuckGo for '{query}'", content=search_results)
         else:
             return ToolResult(
@@ -37,14 +71,19 @@ async def search_duckduckgo(query: str, result_count: int = 5):
             )
 
 
-async def lookup_wikipedia(name: str):
+def _lookup_wikipedia(name: str, query: str | None) -> ToolResult:
     wikipedia = MediaWiki()
     try:
         wikipedia_page = wikipedia.page(title=name, auto_suggest=True)
+        # only the passages relevant to the question go into the prompt, whole
+        # articles easily run into hundreds of kilobytes
+        passages = select_passages(split_passages(wikipedia_page.content), query or name)
         return ToolResult(
             message=f"[Looked up '{name}' on Wikipedia]({wikipedia_page.url})",
             content=SearchResult(
-                title=wikipedia_page.title, url=wikipedia_page.url, content=wikipedia_page.content
+                title=wikipedia_page.title,
+                url=wikipedia_page.url,
+                content=format_passages(passages),
             ),
         )
     except Exception as e:
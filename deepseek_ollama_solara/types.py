@@ -3,20 +3,52 @@ import uuid
 from typing import Any
 
 from ollama import Message as OllamaMessage
-from typing_extensions import TypedDict
+from pydantic import Field, model_validator
+from typing_extensions import NotRequired, TypedDict
 
 
 class Message(OllamaMessage):
+    # assigned up front, so a message can be saved again as it grows
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     created: datetime.datetime
     chain_of_reason: str | None = None
+    # messages loaded from the database only carry the length of their reasoning,
+    # the text itself is loaded when it is shown
+    reasoning_length: int | None = None
+    # set when the generation was stopped before the model finished
+    truncated: bool = False
+
+    @model_validator(mode="after")
+    def _count_reasoning(self):
+        if self.chain_of_reason is not None:
+            self.reasoning_length = len(self.chain_of_reason)
+        elif "reasoning_length" not in self.model_fields_set:
+            # assigning marks the field as set, so message["reasoning_length"] works
+            self.reasoning_length = None
+        return self
 
 
 class ChatDict(TypedDict):
     title: str
     model: str
     id: uuid.UUID
+    # when the chat was created or last got a message, the sidebar is ordered by it
+    last_activity: NotRequired[datetime.datetime]
 
 
 class ToolResult(TypedDict):
     message: str
     content: Any
+
+
+class TurnMetrics(TypedDict):
+    model: str
+    created: datetime.datetime
+    # all durations are in seconds
+    time_to_first_token: float | None
+    tokens_per_second: float | None
+    prompt_tokens: int | None
+    eval_tokens: int | None
+    load_duration: float | None
+    tool_latencies: dict[str, list[float]]
+    persist_duration: float | None
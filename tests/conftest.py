@@ -0,0 +1,11 @@
+import pytest
+
+from deepseek_ollama_solara import database
+
+
+@pytest.fixture
+def chats_db(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, so it gets a chats.db of its own."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "_schema_created", False)
+    return tmp_path / "chats.db"
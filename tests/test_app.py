@@ -0,0 +1,41 @@
+import asyncio
+import datetime
+import uuid
+
+from deepseek_ollama_solara import database
+from deepseek_ollama_solara.app import message_key
+from deepseek_ollama_solara.streaming import StreamAccumulator
+from deepseek_ollama_solara.types import Message
+
+
+def test_messages_with_the_same_role_and_time_get_different_keys():
+    created = datetime.datetime.now()
+    first, second = (Message(role="tool", content="{}", created=created) for _ in range(2))
+    assert message_key(first) != message_key(second)
+
+
+def test_streamed_message_keeps_its_key():
+    accumulator = StreamAccumulator(flush_interval=float("inf"))
+    accumulator.append_content("Hello")
+    first = accumulator.flush()
+    accumulator.append_content(" there")
+    second = accumulator.flush()
+    assert first is not None and second is not None
+    assert message_key(first) == message_key(second)
+
+
+def test_stored_message_keeps_its_key(chats_db):
+    chat_id = uuid.uuid4()
+    message = Message(role="user", content="Hello", created=datetime.datetime.now())
+
+    async def load():
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, [message])
+            return await database.get_messages(chat_id, limit=50)
+        finally:
+            await database.disconnect_database()
+
+    (row,) = asyncio.run(load())
+    assert message_key(row) == message_key(message)
@@ -0,0 +1,76 @@
+import types
+
+import pytest
+
+from deepseek_ollama_solara.tools import breaker as breaker_module
+from deepseek_ollama_solara.tools.breaker import (
+    BREAKER_BACKOFF,
+    BREAKER_MIN_CALLS,
+    BREAKER_PROBE_TIMEOUT,
+    CircuitBreaker,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def opened(clock):
+    breaker = CircuitBreaker()
+    for _ in range(BREAKER_MIN_CALLS):
+        assert breaker.allow()
+        breaker.record(False)
+    return breaker
+
+
+def test_opens_after_failures(opened):
+    assert not opened.available
+    assert not opened.allow()
+    assert opened.retry_in() == BREAKER_BACKOFF
+
+
+def test_half_open_lets_one_call_through(opened, clock):
+    clock[0] += BREAKER_BACKOFF
+    assert opened.available
+    assert opened.allow()
+    # the others wait for the outcome of the trial call
+    assert not opened.available
+    assert not opened.allow()
+
+
+def test_successful_trial_closes(opened, clock):
+    clock[0] += BREAKER_BACKOFF
+    assert opened.allow()
+    opened.record(True)
+    assert opened.opened_at is None
+    assert all(opened.allow() for _ in range(3))
+
+
+def test_failed_trial_reopens_for_longer(opened, clock):
+    clock[0] += BREAKER_BACKOFF
+    assert opened.allow()
+    opened.record(False)
+    clock[0] += BREAKER_BACKOFF
+    assert not opened.allow()
+    clock[0] += BREAKER_BACKOFF
+    assert opened.allow()
+
+
+def test_abandoned_or_lost_trial_lets_another_call_through(opened, clock):
+    clock[0] += BREAKER_BACKOFF
+    assert opened.allow()
+    opened.abandon()
+    assert opened.allow()
+    clock[0] += BREAKER_PROBE_TIMEOUT
+    assert opened.allow()
+
+
+def test_calls_started_before_opening_are_ignored(opened, clock):
+    opened.record(True)
+    assert not opened.available
+    clock[0] += BREAKER_BACKOFF
+    assert opened.allow()
@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+
+from deepseek_ollama_solara import database
+from deepseek_ollama_solara.tools.cache import ToolCache, normalize_arguments
+from deepseek_ollama_solara.types import ToolResult
+
+RESULT = ToolResult(
+    message="Searched the web for 'capital of France'", content="Paris is the capital of France"
+)
+
+
+def search_web(query: str, max_results: int = 5):
+    pass
+
+
+def test_equivalent_arguments_share_a_key():
+    first = normalize_arguments(search_web, {"query": "capital  of\nFrance"})
+    second = normalize_arguments(search_web, {"query": "capital of France", "max_results": 5})
+    assert ToolCache.key("search_web", first) == ToolCache.key("search_web", second)
+
+
+def test_least_recently_used_result_is_evicted():
+    async def scenario():
+        cache = ToolCache(max_size=2)
+        await cache.set("search_web", {"query": "a"}, RESULT)
+        await cache.set("search_web", {"query": "b"}, RESULT)
+        await cache.get("search_web", {"query": "a"})
+        await cache.set("search_web", {"query": "c"}, RESULT)
+        return [await cache.get("search_web", {"query": query}) for query in "abc"]
+
+    assert asyncio.run(scenario()) == [RESULT, None, RESULT]
+
+
+def test_expired_results_are_not_returned():
+    async def scenario():
+        cache = ToolCache(ttl=0)
+        await cache.set("search_web", {"query": "a"}, RESULT)
+        return await cache.get("search_web", {"query": "a"})
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_error_results_are_not_cached():
+    async def scenario():
+        cache = ToolCache()
+        await cache.set("search_web", {"query": "a"}, {**RESULT, "content": "Error: no results"})
+        return await cache.get("search_web", {"query": "a"})
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_database_hit_keeps_its_age(chats_db):
+    async def scenario():
+        await database.connect_database()
+        try:
+            key = ToolCache.key("search_web", {"query": "a"})
+            stored = datetime.datetime.now() - datetime.timedelta(seconds=50)
+            await database.save_tool_result(key, "search_web", '{"content": "old"}', stored)
+            cache = ToolCache(ttl=60, persistent=True)
+            first = await cache.get("search_web", {"query": "a"})
+            age = datetime.datetime.now().timestamp() - cache._entries[key][0]
+            return first, age
+        finally:
+            await database.disconnect_database()
+
+    first, age = asyncio.run(scenario())
+    assert first == {"content": "old"}
+    assert age >= 50
+
+
+def test_expired_rows_are_deleted(chats_db):
+    async def scenario():
+        await database.connect_database()
+        try:
+            expired = datetime.datetime.now() - datetime.timedelta(hours=2)
+            await database.save_tool_result("expired", "search_web", "{}", expired)
+            cache = ToolCache(ttl=60 * 60, persistent=True)
+            await cache.set("search_web", {"query": "a"}, RESULT)
+            rows = await database.database.fetch_all(database.tool_results.select())
+            return [row["key"] for row in rows]
+        finally:
+            await database.disconnect_database()
+
+    assert asyncio.run(scenario()) == [ToolCache.key("search_web", {"query": "a"})]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from collections.abc import Sequence
+
+import pytest
+from ollama import ChatResponse
+from ollama import Message as OllamaMessage
+
+from deepseek_ollama_solara import app, tools
+from deepseek_ollama_solara.tools.cache import ToolCache
+
+MODEL = "deepseek-r1:8b"
+TOOL = {
+    "type": "function",
+    "function": {
+        "name": "lookup",
+        "description": "Looks something up",
+        "parameters": {"type": "object", "properties": {"query": {"type": "string"}}},
+    },
+}
+
+
+class ScriptedClient:
+    """Answers the first `tool_rounds` requests with a tool call, whether tools are offered."""
+
+    def __init__(self, tool_rounds: int, before_call: Sequence[OllamaMessage] = ()):
+        self.tool_rounds = tool_rounds
+        self.before_call = before_call
+        self.requests: list[dict] = []
+
+    async def chat(self, **kwargs):
+        self.requests.append(kwargs)
+        return self._stream(len(self.requests))
+
+    async def _stream(self, request: int):
+        if request <= self.tool_rounds:
+            for message in self.before_call:
+                yield ChatResponse(model=MODEL, message=message, done=False)
+            tool_call = OllamaMessage.ToolCall(
+                function=OllamaMessage.ToolCall.Function(
+                    name="lookup", arguments={"query": str(request)}
+                )
+            )
+            yield ChatResponse(
+                model=MODEL,
+                message=OllamaMessage(role="assistant", tool_calls=[tool_call]),
+                done=False,
+            )
+        else:
+            yield ChatResponse(
+                model=MODEL,
+                message=OllamaMessage(role="assistant", content="Done"),
+                done=True,
+                done_reason="stop",
+            )
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls: list[str] = []
+
+    async def lookup(query: str):
+        calls.append(query)
+        await asyncio.sleep(0.1)
+        return {"message": f"Looked up '{query}'", "content": query}
+
+    monkeypatch.setattr(tools, "tools", [TOOL])
+    monkeypatch.setitem(tools.tool_callables, "lookup", lookup)
+    monkeypatch.setattr(tools, "tool_cache", ToolCache())
+    monkeypatch.setattr(tools, "breakers", {})
+    monkeypatch.setitem(app.SUPPORTS_TOOLS, MODEL, True)
+    app.use_tools.value = True
+    app.messages.value = []
+    yield calls
+    app.use_tools.value = False
+    app.messages.value = []
+
+
+def test_tool_results_are_sent_back_after_text_before_the_call(lookups):
+    client = ScriptedClient(
+        tool_rounds=1,
+        before_call=[
+            OllamaMessage(role="assistant", thinking="I should look it up"),
+            OllamaMessage(role="assistant", content="Let me check."),
+        ],
+    )
+    turn = asyncio.run(app.chat_loop(client, MODEL))
+    assert [message.role for message in turn] == ["assistant", "tool", "assistant"]
+    assert turn[0].chain_of_reason == "I should look it up"
+    assert len(client.requests) == 2
+    assert client.requests[1]["messages"][-1]["role"] == "tool"
+
+
+def test_tool_rounds_are_capped(lookups):
+    client = ScriptedClient(tool_rounds=100)
+    turn = asyncio.run(app.chat_loop(client, MODEL))
+    assert len(client.requests) == app.MAX_TOOL_ROUNDS + 1
+    assert client.requests[-1]["tools"] is None
+    # calls made after the last round with tools are answered without running the tool
+    assert len(lookups) == app.MAX_TOOL_ROUNDS
+    assert [message.role for message in turn] == ["tool"] * (app.MAX_TOOL_ROUNDS + 1)
+
+
+def test_tools_stop_at_the_deadline(lookups, monkeypatch):
+    monkeypatch.setattr(app, "TOOL_TIME_BUDGET", 0.05)
+    client = ScriptedClient(tool_rounds=1)
+    turn = asyncio.run(app.chat_loop(client, MODEL))
+    assert [request["tools"] is not None for request in client.requests] == [True, False]
+    assert "no time left" in json.loads(turn[0].content)["content"]
+    assert turn[-1].content == "Done"
@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import sqlite3
+import uuid
+
+from deepseek_ollama_solara import database
+from deepseek_ollama_solara.types import Message
+
+
+def test_older_pages_include_messages_with_the_same_timestamp(chats_db):
+    chat_id = uuid.uuid4()
+    start = datetime.datetime(2025, 1, 1)
+    # two messages per timestamp
+    chat_messages = [
+        Message(role="user", content=str(index), created=start + datetime.timedelta(index // 2))
+        for index in range(6)
+    ]
+
+    async def scenario():
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, chat_messages)
+            pages = [await database.get_messages(chat_id, limit=3)]
+            while len(pages[-1]) == 3:
+                oldest = pages[-1][0]
+                before = (oldest["created"], oldest["id"])
+                pages.append(await database.get_messages(chat_id, before=before, limit=3))
+            return [message["content"] for page in reversed(pages) for message in page]
+        finally:
+            await database.disconnect_database()
+
+    expected = [
+        message.content for message in sorted(chat_messages, key=lambda m: (m.created, m.id.hex))
+    ]
+    assert asyncio.run(scenario()) == expected
+
+
+def test_too_short_prefix_is_not_searched():
+    assert database.search_query("w") is None
+    assert database.search_query("lake w") == '"lake"'
+    assert database.search_query("lake wi") == '"lake" "wi"*'
+
+
+def test_search_index_is_rebuilt_with_prefix_indexes(chats_db, monkeypatch):
+    chat_id = uuid.uuid4()
+    message = Message(role="user", content="lake cabin wifi", created=datetime.datetime.now())
+
+    async def store():
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, [message])
+        finally:
+            await database.disconnect_database()
+
+    async def search():
+        await database.connect_database()
+        try:
+            return await database.search_messages("cabin wi")
+        finally:
+            await database.disconnect_database()
+
+    asyncio.run(store())
+    # as created before there were prefix indexes
+    with sqlite3.connect(chats_db) as connection:
+        connection.execute("DROP TABLE messages_fts")
+        connection.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, chain_of_reason, message_id UNINDEXED, chat_id UNINDEXED)"
+        )
+    monkeypatch.setattr(database, "_schema_created", False)
+    results = asyncio.run(search())
+    with sqlite3.connect(chats_db) as connection:
+        (sql,) = connection.execute("SELECT sql FROM sqlite_master WHERE name = 'messages_fts'")
+    assert "prefix='2 3'" in sql[0]
+    assert [result["message_id"] for result in results] == [message.id]
+
+
+def test_search_pages_past_the_ranked_window(chats_db, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_MAX_MATCHES", 3)
+    chat_id = uuid.uuid4()
+    start = datetime.datetime(2025, 1, 1)
+    chat_messages = [
+        Message(role="user", content=f"cabin {index}", created=start + datetime.timedelta(index))
+        for index in range(8)
+    ]
+
+    async def scenario():
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, chat_messages)
+            pages = []
+            for limit in (2, 5, 2):
+                offset = sum(len(page) for page in pages)
+                pages.append(await database.search_messages("cabin", limit=limit, offset=offset))
+            return pages
+        finally:
+            await database.disconnect_database()
+
+    pages = asyncio.run(scenario())
+    assert [len(page) for page in pages] == [2, 5, 1]
+    found = [result["message_id"] for page in pages for result in page]
+    assert sorted(found) == sorted(message.id for message in chat_messages)
+    # the newest window comes first
+    assert {result["message_id"] for result in pages[0]} <= {m.id for m in chat_messages[5:]}
+
+
+def test_legacy_reasoning_is_moved_and_indexed(chats_db, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_CHAIN_OF_REASON", True)
+    chat_id = uuid.uuid4()
+    created = datetime.datetime(2025, 1, 1)
+    legacy, stored = (
+        Message(role="assistant", content="Answer", created=created, chain_of_reason=reason)
+        for reason in ("Thinking about herons", "Thinking about otters")
+    )
+
+    async def store():
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, [legacy, stored])
+        finally:
+            await database.disconnect_database()
+
+    async def load():
+        await database.connect_database()
+        try:
+            return (
+                await database.get_reasoning(legacy.id),
+                await database.get_messages(chat_id),
+                await database.search_messages("herons"),
+                await database.search_messages("otters"),
+            )
+        finally:
+            await database.disconnect_database()
+
+    asyncio.run(store())
+    # as stored by a version that kept reasoning in the messages table
+    with sqlite3.connect(chats_db) as connection:
+        connection.execute("ALTER TABLE messages ADD COLUMN chain_of_reason VARCHAR")
+        connection.execute(
+            "UPDATE messages SET chain_of_reason = ?, reasoning_length = NULL WHERE id = ?",
+            (legacy.chain_of_reason, legacy.id.hex),
+        )
+        connection.execute("DELETE FROM reasoning WHERE message_id = ?", (legacy.id.hex,))
+        connection.execute("DROP TABLE messages_fts")
+    monkeypatch.setattr(database, "_schema_created", False)
+    reasoning, rows, herons, otters = asyncio.run(load())
+    assert reasoning == legacy.chain_of_reason
+    assert {row["id"]: row["reasoning_length"] for row in rows} == {
+        legacy.id: len(legacy.chain_of_reason or ""),
+        stored.id: len(stored.chain_of_reason or ""),
+    }
+    assert [result["message_id"] for result in herons] == [legacy.id]
+    assert [result["message_id"] for result in otters] == [stored.id]
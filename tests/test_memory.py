@@ -0,0 +1,101 @@
+import asyncio
+import datetime
+import uuid
+
+import numpy as np
+
+from benchmarks.fake_ollama import hashed_embedding
+from deepseek_ollama_solara import database, memory
+from deepseek_ollama_solara.memory import MemoryIndex, VectorStore, normalize
+from deepseek_ollama_solara.types import Message
+
+FACT = "The wifi password at the lake cabin is heron47"
+QUESTION = "What was the wifi password at the lake cabin?"
+
+
+async def bag_of_words(texts: list[str]) -> np.ndarray:
+    return np.array([hashed_embedding(text) for text in texts])
+
+
+def test_search_returns_the_most_similar_rows_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "SEARCH_CHUNK_ROWS", 100)
+    vectors = normalize(np.random.default_rng(0).standard_normal((1000, 16)), 16)
+    store = VectorStore(str(tmp_path / "vectors"), 16)
+    store.open()
+    store.write(0, vectors)
+    rows, scores = store.search(vectors[123], 1000, 5)
+    expected = np.argsort(-(vectors @ vectors[123]))[:5]
+    assert rows.tolist() == expected.tolist()
+    assert scores[0] == max(scores)
+
+
+def test_fact_from_another_chat_is_recalled(chats_db):
+    fact_chat, other_chat = uuid.uuid4(), uuid.uuid4()
+    created = datetime.datetime(2025, 1, 1)
+
+    async def scenario():
+        await database.connect_database()
+        try:
+            index = MemoryIndex(path=str(chats_db.parent / "chats.memory"), embed=bag_of_words)
+            for chat_id in (fact_chat, other_chat):
+                await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(
+                fact_chat, [Message(role="user", content=FACT, created=created)]
+            )
+            await database.create_messages(
+                other_chat,
+                [Message(role="user", content="Pasta recipe with garden basil", created=created)],
+            )
+            await index.sync()
+            # nothing new to index
+            await index.sync()
+            rows = index.rows
+            elsewhere = await index.recall(QUESTION, uuid.uuid4())
+            # the chat's own messages from after `before` are in the prompt already
+            same_chat = await index.recall(QUESTION, fact_chat, before=created)
+            return rows, elsewhere, same_chat
+        finally:
+            await database.disconnect_database()
+
+    rows, elsewhere, same_chat = asyncio.run(scenario())
+    assert rows == 2
+    assert [recollection["content"] for recollection in elsewhere] == [FACT]
+    assert same_chat == []
+
+
+def test_sync_goes_on_from_the_last_indexed_message(chats_db, monkeypatch):
+    monkeypatch.setattr(memory, "INDEX_BATCH_SIZE", 2)
+    chat_id = uuid.uuid4()
+    created = datetime.datetime(2025, 1, 1)
+
+    def chat_messages(count: int, **fields) -> list[Message]:
+        return [
+            Message(role="user", content=f"Message {index}", created=created, **fields)
+            for index in range(count)
+        ]
+
+    async def scenario():
+        path = str(chats_db.parent / "chats.memory")
+        await database.connect_database()
+        try:
+            await database.create_chat("Chat", chat_id, "deepseek-r1:8b")
+            await database.create_messages(chat_id, chat_messages(5))
+            await database.create_messages(chat_id, chat_messages(1, truncated=True))
+            index = MemoryIndex(path=path, embed=bag_of_words)
+            await index.sync()
+            indexed = index.rows
+            # started again, with messages imported from a backup since, which are older
+            await database.create_messages(
+                chat_id,
+                [
+                    message.model_copy(update={"created": created.replace(year=2020)})
+                    for message in chat_messages(3)
+                ],
+            )
+            index = MemoryIndex(path=path, embed=bag_of_words)
+            await index.sync()
+            return indexed, index.rows
+        finally:
+            await database.disconnect_database()
+
+    assert asyncio.run(scenario()) == (5, 8)
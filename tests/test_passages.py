@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.passages import QUERIES, padded_article
+from deepseek_ollama_solara.tools.passages import (
+    PASSAGE_BUDGET_CHARS,
+    PASSAGE_CHARS,
+    bm25_scores,
+    format_passages,
+    select_passages,
+    split_passages,
+)
+
+
+def test_passages_keep_their_section():
+    passages = split_passages("Lead.\n\n== History ==\nOld.\n== Keepers ==\n" + "Long. " * 400)
+    sections = [passage["section"] for passage in passages]
+    # the long section is split into several passages of about PASSAGE_CHARS
+    assert sections[:3] == [None, "History", "Keepers"]
+    assert sections.count("Keepers") == 3
+    assert all(len(passage["text"]) < 1.2 * PASSAGE_CHARS for passage in passages)
+
+
+def test_documents_with_more_query_terms_score_higher():
+    scores = bm25_scores(["the lamp", "the fresnel lens", "fresnel"], "fresnel lens")
+    assert scores.argmax() == 1
+    assert scores[0] == 0
+
+
+@pytest.mark.parametrize(("query", "section"), QUERIES)
+def test_selection_finds_the_answering_section(query, section):
+    passages = select_passages(split_passages(padded_article(200)), query)
+    assert section in [passage["section"] for passage in passages]
+    # the lead is kept, and the rest stays in article order within the budget
+    assert passages[0]["section"] is None
+    assert len(format_passages(passages)) <= PASSAGE_BUDGET_CHARS + 200
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.reasoning import check
+from deepseek_ollama_solara.reasoning import ReasoningParser, reasoning_delimiters
+from deepseek_ollama_solara.streaming import StreamAccumulator
+
+
+def test_randomly_split_streams_are_parsed_correctly():
+    result = check(5000)
+    assert result["failures"] == 0, result["first_failure"]
+
+
+@pytest.mark.parametrize(
+    ("model", "delimiters"),
+    [
+        ("deepseek-r1:8b", ("<think>", "</think>")),
+        ("marco-o1:7b", ("<Thought>", "</Thought>")),
+        (None, ("<think>", "</think>")),
+    ],
+)
+def test_delimiters_are_looked_up_by_model_name(model, delimiters):
+    assert reasoning_delimiters(model) == delimiters
+
+
+def test_unfinished_tag_is_text():
+    parser = ReasoningParser()
+    assert parser.feed("a <thi") == [("a ", False)]
+    assert parser.finish() == [("<thi", False)]
+
+
+def test_accumulator_splits_reasoning_from_the_answer():
+    accumulator = StreamAccumulator(flush_interval=float("inf"))
+    for delta in ["<thi", "nk>Let me", " think</th", "ink>\n\nThe answer"]:
+        accumulator.append_content(delta)
+    accumulator.finish()
+    message = accumulator.flush()
+    assert message is not None
+    assert message.chain_of_reason == "Let me think"
+    assert message.content.strip() == "The answer"
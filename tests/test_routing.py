@@ -0,0 +1,51 @@
+import uuid
+from collections import OrderedDict
+from contextlib import ExitStack
+
+import pytest
+
+from deepseek_ollama_solara import client
+from deepseek_ollama_solara.scheduler import GenerationScheduler
+
+MODEL = "deepseek-r1:8b"
+HOSTS = ["http://gpu1:11434", "http://gpu2:11434", "http://gpu3:11434"]
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    monkeypatch.setenv(client.HOSTS_VARIABLE, ",".join(HOSTS))
+    monkeypatch.setattr(client, "_backends", {})
+    monkeypatch.setattr(client, "_pinned_chats", OrderedDict())
+    pool = client.backends()
+    for backend in pool:
+        backend.models = {MODEL}
+        backend.resident_models = {MODEL}
+    return pool
+
+
+def test_every_server_with_the_model_adds_slots(servers):
+    scheduler = GenerationScheduler()
+    assert scheduler.concurrency(MODEL) == 3
+    servers[0].mark_failed()
+    servers[1].models = {"llama3.2:3b"}
+    assert scheduler.concurrency(MODEL) == 1
+
+
+def test_generations_are_spread_over_the_servers(servers):
+    with ExitStack() as requests:
+        chosen = []
+        for _ in HOSTS:
+            backend = client.choose_backend(MODEL, uuid.uuid4())
+            requests.enter_context(backend.request(MODEL))
+            chosen.append(backend.host)
+    assert sorted(chosen) == HOSTS
+
+
+def test_chat_moves_off_its_server_while_that_is_full(servers):
+    chat_id = uuid.uuid4()
+    client.pin_chat(chat_id, servers[0])
+    assert client.choose_backend(MODEL, chat_id) is servers[0]
+    with servers[0].request(MODEL):
+        assert client.choose_backend(MODEL, chat_id) is not servers[0]
+        # other models still fit on it
+        assert client.choose_backend("llama3.2:3b", chat_id) is servers[0]